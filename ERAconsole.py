@@ -3,21 +3,29 @@ import sys
 import time
 import json
 import os
+import random
 from Musicbox import MusicBox
-from dynamic_loader import DynamicLoader, ContentType, InlineFragment  # 导入动态加载器
+from dynamic_loader import DynamicLoader, ContentType, InlineFragment, ImageLayer  # 导入动态加载器
 from clickable import ClickableString
+from input_replay import InputReplay, InputRecorder, SOURCE_KEY, SOURCE_CLICK
+from chara_manifest import load_chara_manifests
+from startup import StartupPipeline, DONE as STAGE_DONE, FAILED as STAGE_FAILED, RUNNING as STAGE_RUNNING
+from utils.era_handler import EraKojoHandler
+from contextlib import contextmanager
 import ctypes
 try:
     ctypes.windll.user32.SetProcessDPIAware()
 except AttributeError:
     pass # 非 Windows 系统忽略
 
+# 等待输入时驱动光标闪烁的定时器事件
+CURSOR_BLINK_EVENT = pygame.event.custom_type()
+
 class SimpleERAConsole:
     from init import initall
 
     def __init__(self):
-        pygame.init()
-        
+        self._created_at = time.perf_counter()  # 用于计算启动到首帧的耗时
         # 默认配置
         self.default_config = {
             "window_title": "ERA Console---",
@@ -25,17 +33,39 @@ class SimpleERAConsole:
             "font_size": 24,
             "screen_width": 2000,
             "screen_height": 1200,
-            "log_file": "./logs/game_log.txt"
+            "log_file": "./logs/game_log.txt",
+            "dirty_rects": True,
+            "coalesce_present": True,
+            "image_cache_mb": 256,
+            "async_image_workers": 2,
+            "pixel_cache_mb": 512,
+            "log_format": "text",
+            "log_max_mb": 5,
+            "headless": False,
+            "input_script": "",
+            "input_record": "",
+            "random_seed": None,
+            "manifest_workers": 4,
+            "manifest_cache": "./cache/chara_manifests.json"
         }
         
         # 加载配置文件
         self.config = self._load_config()
+
+        # 无界面模式：用 SDL 的 dummy 驱动，不打开窗口、不推送屏幕，
+        # 排版/换行/缓存逻辑照常执行（用于在没有显示器的机器上跑事件脚本和性能测试）
+        # 环境变量 PERA_HEADLESS 优先于配置文件
+        self.headless = self._headless_requested()
+        if self.headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        pygame.init()
         
         # 使用配置或默认值
         self.screen_width = self.config.get("screen_width", self.default_config["screen_width"])
         self.screen_height = self.config.get("screen_height", self.default_config["screen_height"])
         
-        # 创建屏幕
+        # 创建屏幕（dummy 驱动下是一块内存中的 Surface，convert_alpha 等照常可用）
         self.screen = pygame.display.set_mode(
             (self.screen_width, self.screen_height))
         pygame.display.set_caption(self.config.get("window_title", self.default_config["window_title"]))
@@ -59,6 +89,20 @@ class SimpleERAConsole:
 
         # 输入区域高度
         self.input_area_height = 40
+        # 输入行所在区域（脏区域模式下单独更新）
+        self.input_y = self.screen_height - self.input_area_height + 10
+        self.input_rect = pygame.Rect(
+            0, self.input_y, self.screen_width, self.screen_height - self.input_y)
+        # 是否只把变化的区域推送到屏幕（否则每帧整屏 flip）
+        self.dirty_rects_enabled = self.config.get(
+            "dirty_rects", self.default_config["dirty_rects"])
+        # 延迟呈现：连续 PRINT 时每个显示周期最多呈现一帧
+        self.coalesce_present = self.config.get(
+            "coalesce_present", self.default_config["coalesce_present"])
+        self.present_interval = 1 / 60  # 显示周期（秒）
+        self._last_present_time = 0.0
+        self._present_pending = False
+        self._batch_depth = 0
 
         # 初始化动态加载器
         self.loader = DynamicLoader(
@@ -66,15 +110,32 @@ class SimpleERAConsole:
             screen_height=self.screen_height,
             font=self.font,
             input_area_height=self.input_area_height,
-            log_file=self.config.get("log_file", self.default_config["log_file"])
+            log_file=self.config.get("log_file", self.default_config["log_file"]),
+            image_cache_mb=self.config.get(
+                "image_cache_mb", self.default_config["image_cache_mb"]),
+            image_workers=self.config.get(
+                "async_image_workers", self.default_config["async_image_workers"]),
+            pixel_cache_mb=self.config.get(
+                "pixel_cache_mb", self.default_config["pixel_cache_mb"]),
+            log_format=self.config.get(
+                "log_format", self.default_config["log_format"]),
+            log_max_mb=self.config.get(
+                "log_max_mb", self.default_config["log_max_mb"])
         )
 
         # 输入相关
         self.input_text = ""
+        self.composition_text = ""  # 输入法正在输入的拼音/未确认文本
+        self._input_dirty = True  # 输入行是否需要重绘
         self.input_history = []  # 输入历史记录
         self.input_history_index = -1  # 当前输入历史索引
         self.cursor_visible = True
-        self.cursor_timer = 0
+        self.cursor_blink_ms = 500  # 光标闪烁间隔
+        self.max_fps = 60  # 等待输入时的最高重绘帧率
+        self.clock = pygame.time.Clock()
+        self._ime_rect = None  # 上次设置的输入法候选框位置
+        self._window_focused = True
+        self._window_minimized = False
         self.running = True
 
         # 初始化音乐盒和音乐列表
@@ -84,11 +145,45 @@ class SimpleERAConsole:
         self.clickable_regions = []  # 存储所有可点击区域
         self.clickable_region_counter = 0  # 可点击区域计数器
 
+        # 输入回放/录制（环境变量优先于配置文件）
+        self.input_replay = None
+        self.input_recorder = None
+        script = os.environ.get("PERA_INPUT_SCRIPT") or self.config.get(
+            "input_script", self.default_config["input_script"])
+        if script:
+            try:
+                self.input_replay = InputReplay.from_file(script)
+                print(f"已加载输入脚本: {script}（{len(self.input_replay)} 步）")
+            except (OSError, ValueError) as e:
+                self._show_warning(f"加载输入脚本失败: {e}")
+        record = os.environ.get("PERA_INPUT_RECORD") or self.config.get(
+            "input_record", self.default_config["input_record"])
+        if record:
+            try:
+                self.input_recorder = InputRecorder(record)
+            except OSError as e:
+                self._show_warning(f"创建输入录制文件失败: {e}")
+        seed = os.environ.get("PERA_SEED", self.config.get(
+            "random_seed", self.default_config["random_seed"]))
+        if seed not in (None, ""):
+            self.seed_random(seed)
+
         # 图片数据相关
         self.image_data = {}  # 图片数据字典，键为"角色ID_图片名"，值为图片信息
         self.chara_images = {}  # 角色立绘字典，键为角色ID，值为该角色下的图片列表
+        # 立绘清单的扫描线程数与缓存文件（空字符串表示不缓存）
+        self.manifest_workers = self.config.get(
+            "manifest_workers", self.default_config["manifest_workers"])
+        self.manifest_cache_path = self.config.get(
+            "manifest_cache", self.default_config["manifest_cache"])
+        # 图片名索引（加载立绘清单后由 _build_image_indexes 建立）
+        self.image_index_by_name = {}  # 原始图片名 -> 完整名称列表
+        self.image_index_by_key = {}  # (角色ID, 立绘类型, 原始图片名) -> 完整名称
         # 状态大字典
         self.allstate = {}
+        # 启动耗时（毫秒），init_all 完成后填入
+        self.first_frame_ms = None
+        self.startup_timings = {}
 
     def _load_config(self):
         """加载配置文件"""
@@ -119,6 +214,46 @@ class SimpleERAConsole:
             print(f"加载配置文件失败: {e}，使用默认配置")
             return self.default_config.copy()
 
+    def _headless_requested(self):
+        """是否以无界面模式运行：环境变量 PERA_HEADLESS（1/true/yes/on）优先，否则看配置"""
+        env = os.environ.get("PERA_HEADLESS")
+        if env is not None:
+            return env.strip().lower() in ("1", "true", "yes", "on")
+        return bool(self.config.get("headless", self.default_config["headless"]))
+
+    def seed_random(self, seed):
+        """固定随机种子（全局 random 与口上的 Rand），让回放结果可复现"""
+        if isinstance(seed, str) and seed.lstrip('-').isdigit():
+            seed = int(seed)
+        random.seed(seed)
+        EraKojoHandler.seed_rng(seed)
+
+    def queue_inputs(self, *values, source=SOURCE_KEY):
+        """把输入追加到回放队列，之后的 INPUT 会依次直接返回它们"""
+        if self.input_replay is None:
+            self.input_replay = InputReplay()
+        self.input_replay.extend(values, source)
+
+    def _record_input(self, value, source):
+        if self.input_recorder is not None:
+            self.input_recorder.record(value, source)
+
+    def _replay_input(self, value, source):
+        """返回一条回放的输入，对历史记录的改动与手动回车/点击完全相同"""
+        pygame.event.pump()  # 保持窗口响应
+        if source == SOURCE_KEY:
+            if value:
+                self.input_history.append(value)
+            self.input_history_index = -1
+            self.loader.add_text(f"{value}", (255, 255, 200))
+            self.loader.add_text("")  # 空行
+        elif source == SOURCE_CLICK:
+            # 与 _handle_mouse_click 一致：点击只追加一个空行
+            self.input_text = value
+            self.loader.add_text("")  # 空行
+        self._record_input(value, source)
+        return value
+
     def _create_default_config(self, config_file):
         """创建默认配置文件"""
         try:
@@ -171,8 +306,7 @@ class SimpleERAConsole:
                 200, 255, 200))
 
             # 刷新显示
-            self._draw_display()
-            pygame.display.flip()
+            self._present(full=True)
 
         except FileNotFoundError:
             self.PRINT(f"字体文件未找到: {font_path}", colors=(255, 200, 200))
@@ -228,48 +362,61 @@ class SimpleERAConsole:
             self.loader.add_image_mark(img_mark, click_value)
 
             # 刷新显示
-            self._draw_display()
-            pygame.display.flip()
+            self._request_present()
 
         except Exception as e:
             self.PRINT(f"显示图片失败 {url}: {e}", colors=(255, 200, 200))
 
     # 在ERAconsole.py中修复_find_image_info方法
     def _find_image_info(self, img_url, chara_id=None, draw_type=None):
-        """根据图片名、角色ID和立绘类型查找图片信息 - 修复版"""
-        # 尝试直接查找（假设img_url已经是完整的注册名）
+        """
+        根据图片名、角色ID和立绘类型查找图片信息
+
+        依次尝试：完整名称、(角色ID, 立绘类型, 原始名)、原始名。
+        原始名在多个角色/立绘类型中重复时，用 chara_id / draw_type 缩小范围，
+        仍不唯一则不猜测，返回 None（重复的名字在加载时已报告）。
+        找不到时返回 None，由调用方提示。
+        """
+        # 完整名称（角色ID_立绘类型_原始名）
         if img_url in self.image_data:
             return self._get_image_info_dict(img_url)
 
-        # 如果有角色ID和立绘类型，尝试构建完整名称查找
         if chara_id and draw_type:
-            # 构建可能的名称格式
-            possible_names = [
-                f"{chara_id}_{draw_type}_{img_url}",
-                f"{chara_id}_{img_url}",
-                img_url
-            ]
-
-            for name in possible_names:
-                if name in self.image_data:
-                    return self._get_image_info_dict(name)
-
-        # 尝试在所有图片中查找原始名称匹配
-        for img_name, img_info in self.image_data.items():
-            if img_info.get('original_name') == img_url:
-                return self._get_image_info_dict(img_name)
-
-        # 最后尝试：如果img_url包含角色ID和立绘类型，直接分割查找
-        if '_' in img_url:
-            parts = img_url.split('_')
-            if len(parts) >= 3:
-                # 格式可能是：角色ID_立绘类型_图片名
-                possible_name = img_url
-                if possible_name in self.image_data:
-                    return self._get_image_info_dict(possible_name)
-
-        self.PRINT(f"图片 {img_url} 不存在于数据中", colors=(255, 200, 200))
-        return None
+            name = self.image_index_by_key.get((str(chara_id), draw_type, img_url))
+            if name is None and f"{chara_id}_{img_url}" in self.image_data:
+                name = f"{chara_id}_{img_url}"
+            if name is not None:
+                return self._get_image_info_dict(name)
+
+        candidates = self.image_index_by_name.get(img_url)
+        if not candidates:
+            return None
+        if len(candidates) > 1:
+            candidates = [name for name in candidates
+                          if (not chara_id or self.image_data[name].get('chara_id') == str(chara_id))
+                          and (not draw_type or self.image_data[name].get('draw_type') == draw_type)]
+            if len(candidates) != 1:
+                self.PRINT(f"图片名 {img_url} 不唯一，请指定角色ID/立绘类型或使用完整名称",
+                           colors=(255, 200, 200))
+                return None
+        return self._get_image_info_dict(candidates[0])
+
+    def _build_image_indexes(self):
+        """
+        为图片名解析建立索引，并报告重复的原始图片名
+
+        Returns:
+            {原始名: [完整名称, ...]}，只包含重复的名字
+        """
+        by_name = {}
+        by_key = {}
+        for name, info in self.image_data.items():
+            original_name = info.get('original_name', name)
+            by_name.setdefault(original_name, []).append(name)
+            by_key[(info.get('chara_id'), info.get('draw_type'), original_name)] = name
+        self.image_index_by_name = by_name
+        self.image_index_by_key = by_key
+        return {name: names for name, names in by_name.items() if len(names) > 1}
 # ERAconsole.py
 
     def _get_image_info_dict(self, img_name):
@@ -305,14 +452,11 @@ class SimpleERAConsole:
             img_list: 图片列表
         """
         try:
-            stack_elements = []  # 存储每个图片元素的字符串
-            max_height = 0       # 计算最高图片高度
+            layers = []      # 按顺序叠加的图层
+            max_height = 0   # 计算最高图片高度
 
             for img_item in img_list:
-                # 初始化图片特定参数
-                item_params = {}
-
-                # 处理不同类型的图片项
+                # 处理不同类型的图片项：字典可以覆盖全局参数，字符串直接使用全局参数
                 if isinstance(img_item, dict):
                     img_url = img_item.get('img')
                     item_draw_type = img_item.get('draw_type', draw_type)
@@ -321,24 +465,7 @@ class SimpleERAConsole:
                     item_size = img_item.get('size', size)
                     item_clip = img_item.get('clip', clip_pos)
                     item_offset = img_item.get('offset', (0, 0))
-
-                    # 保存图片特定参数
-                    if item_clip:
-                        item_params['clip'] = f"({item_clip[0]},{item_clip[1]})"
-                    if item_size:
-                        item_params['size'] = f"({item_size[0]},{item_size[1]})"
-                        max_height = max(max_height, item_size[1])
-                    if item_click:
-                        item_params['click'] = str(item_click)  # 确保为字符串
-                    if item_chara_id:
-                        item_params['chara'] = str(item_chara_id)
-                    if item_draw_type:
-                        item_params['type'] = str(item_draw_type)
-                    if item_offset and item_offset != (0, 0):
-                        item_params['offset'] = f"({item_offset[0]},{item_offset[1]})"
-
                 else:
-                    # 字符串格式
                     img_url = img_item
                     item_draw_type = draw_type
                     item_chara_id = chara_id
@@ -347,19 +474,6 @@ class SimpleERAConsole:
                     item_clip = clip_pos
                     item_offset = (0, 0)
 
-                    # 使用全局参数
-                    if clip_pos:
-                        item_params['clip'] = f"({clip_pos[0]},{clip_pos[1]})"
-                    if size:
-                        item_params['size'] = f"({size[0]},{size[1]})"
-                        max_height = max(max_height, size[1])
-                    if click:
-                        item_params['click'] = str(click)  # 确保为字符串
-                    if chara_id:
-                        item_params['chara'] = str(chara_id)
-                    if draw_type:
-                        item_params['type'] = str(draw_type)
-
                 # 查找图片信息 - 修复：优先使用原始名称
                 img_info = self._find_image_info(
                     img_url, item_chara_id, item_draw_type)
@@ -369,191 +483,157 @@ class SimpleERAConsole:
 
                 # 使用原始图片名作为标识
                 original_name = img_info.get('original_name', img_url)
-
-                # 构建唯一的图片标识符
                 if item_chara_id and item_draw_type:
                     img_identifier = f"{item_chara_id}_{item_draw_type}_{original_name}"
                 else:
                     img_identifier = original_name
 
-                # 注册图片信息（使用原始名称）
-                self.loader.register_image_info(img_identifier, img_info)
-
-                # 如果没有size参数，使用图片原始高度
-                if not item_size:
-                    original_height = img_info.get('original_height', 270)
-                    max_height = max(max_height, original_height)
-
-                # 构建图片元素字符串 - 修复：使用逗号分隔元素
-                element_str = f"{img_identifier}"
-
-                # 如果有参数，添加到元素中
-                if item_params:
-                    # 将参数字典转换为字符串：clip:(x,y),size:(w,h),click:value
-                    # params_str = ','.join([f"{key}:{value}" for key, value in item_params.items()])
-                    params_str = ';'.join(
-                        [f"{key}:{value}" for key, value in item_params.items()])
-                    element_str += f"{{{params_str}}}"
-
-                stack_elements.append(element_str)
-
-            if not stack_elements:
+                # 直接构造图层交给加载器，不再拼成 [IMG_STACK:...] 字符串
+                layer = ImageLayer.from_info(
+                    img_identifier, img_info,
+                    clip=tuple(item_clip[:2]) if item_clip else None,
+                    size=tuple(item_size[:2]) if item_size else None,
+                    offset=tuple(item_offset[:2]) if item_offset else None,
+                    click_value=str(item_click) if item_click else None,
+                    chara_id=str(item_chara_id) if item_chara_id else None,
+                    draw_type=str(item_draw_type) if item_draw_type else None)
+                layers.append(layer)
+                max_height = max(max_height, layer.display_height)
+
+            if not layers:
                 self.PRINT("图片列表为空或所有图片都不存在", colors=(255, 200, 200))
                 return
 
-            # 构建完整的图片叠加标记 - 修复：使用逗号分隔元素
-            # 格式: [IMG_STACK:img1{clip:(x,y),size:(w,h),click:value},img2{...}]
-            stack_content = '|'.join(stack_elements)
-            stack_mark = f"[IMG_STACK:{stack_content}]"
-
             # 计算模板尺寸
             template_width = self.screen_width - 20
             template_height = max_height
 
             # 添加到动态加载器
             click_value = str(click) if click else None
-            self.loader.add_image_mark(
-                stack_mark, click_value, template_width, template_height)
+            self.loader.add_image_stack(
+                layers, click_value, template_width, template_height)
 
             # 刷新显示
-            self._draw_display()
-            pygame.display.flip()
+            self._request_present()
 
         except Exception as e:
             self.PRINT(f"显示图片叠加失败: {e}", colors=(255, 200, 200))
 
+    def _apply_atlas(self, atlas, image_names):
+        """把图片数据中的源文件和裁剪位置改写为图集中的位置"""
+        entries = atlas['entries']
+        for img_name in image_names:
+            img_info = self.image_data[img_name]
+            rect = entries.get(img_info['original_name'])
+            # 图集里没有的差分（例如裁剪区域超出原图）继续使用原图
+            if rect and rect[2:] == [img_info['width'], img_info['height']]:
+                img_info['filename'] = atlas['image']
+                img_info['x'], img_info['y'] = rect[0], rect[1]
+
     def _load_all_chara_images(self):
         """加载所有角色的立绘数据 - 支持新的目录结构 ./img/角色id/xx绘/角色id.csv"""
         if not hasattr(self, 'init') or not hasattr(self.init, 'chara_ids'):
             self.PRINT("角色ID列表未初始化，无法加载角色立绘", colors=(255, 200, 200))
             return
 
-        total_chara_images = 0
+        start = time.perf_counter()
+        results, from_cache = self._scan_chara_manifests(self.init)
+        self._apply_chara_manifests(
+            results, from_cache, (time.perf_counter() - start) * 1000)
 
-        for chara_id in self.init.chara_ids:
-            # 构建角色目录路径
-            chara_dir = f"./img/{chara_id}/"
+    def _scan_chara_manifests(self, init):
+        """读取立绘清单（不改动控制台状态，可以在启动线程中调用）"""
+        return load_chara_manifests(
+            init.chara_ids, "./img", self.manifest_workers, self.manifest_cache_path)
 
-            if not os.path.exists(chara_dir):
-                self.PRINT(f"角色目录不存在: {chara_dir}", colors=(255, 200, 200))
+    def _apply_chara_manifests(self, results, from_cache, elapsed_ms):
+        """把清单扫描结果合并进 image_data / chara_images，输出汇总并注册到加载器"""
+        total_chara_images = 0
+        manifest_count = 0
+        missing_charas = []
+        problems = []
+
+        for chara_id, result in zip(self.init.chara_ids, results):
+            if not result['exists']:
+                missing_charas.append(chara_id)
                 continue
 
             # 初始化该角色的立绘字典
             self.chara_images[chara_id] = {}
 
-            # 扫描角色目录下的所有子目录
-            for item in os.listdir(chara_dir):
-                item_path = os.path.join(chara_dir, item)
-
-                # 只处理目录，并且目录名以"绘"结尾（假设立绘目录都以此结尾）
-                if os.path.isdir(item_path) and item.endswith('绘'):
-                    draw_type = item  # 例如："立绘", "表情绘", "服装绘"等
-                    csv_path = os.path.join(item_path, f"{chara_id}.csv")
-
-                    if os.path.exists(csv_path):
-                        try:
-                            draw_image_list = []
-
-                            with open(csv_path, 'r', encoding='utf-8-sig') as f:
-                                for line in f:
-                                    line = line.strip()
-                                    if line and not line.startswith(';'):
-                                        parts = [p.strip()
-                                                 for p in line.split(',')]
-                                        if len(parts) >= 2:
-                                            name = parts[0]
-                                            filename = parts[1]
-
-                                            # 使用角色ID和立绘类型作为前缀，避免命名冲突
-                                            prefixed_name = f"{chara_id}_{draw_type}_{name}"
-
-                                            if len(parts) >= 6:
-                                                try:
-                                                    x, y, width, height = int(parts[2]), int(
-                                                        parts[3]), int(parts[4]), int(parts[5])
-                                                    self.image_data[prefixed_name] = {
-                                                        'filename': filename,
-                                                        'base_dir': item_path,  # 使用立绘目录作为基础目录
-                                                        'x': x,
-                                                        'y': y,
-                                                        'width': width,
-                                                        'height': height,
-                                                        'chara_id': chara_id,
-                                                        'draw_type': draw_type,  # 新增：立绘类型
-                                                        'original_name': name  # 保留原始名称
-                                                    }
-                                                except ValueError:
-                                                    self.image_data[prefixed_name] = {
-                                                        'filename': filename,
-                                                        'base_dir': item_path,
-                                                        'x': 0,
-                                                        'y': 0,
-                                                        'width': 270,
-                                                        'height': 270,
-                                                        'chara_id': chara_id,
-                                                        'draw_type': draw_type,
-                                                        'original_name': name
-                                                    }
-                                            else:
-                                                self.image_data[prefixed_name] = {
-                                                    'filename': filename,
-                                                    'base_dir': item_path,
-                                                    'x': 0,
-                                                    'y': 0,
-                                                    'width': 270,
-                                                    'height': 270,
-                                                    'chara_id': chara_id,
-                                                    'draw_type': draw_type,
-                                                    'original_name': name
-                                                }
-
-                                            draw_image_list.append(
-                                                prefixed_name)
-                                            total_chara_images += 1
-
-                            # 将立绘类型下的图片列表存储到字典中
-                            self.chara_images[chara_id][draw_type] = draw_image_list
-
-                            chara_name = self.init.charaters_key.get(
-                                chara_id, {}).get('名前', f'角色{chara_id}')
-                            self.PRINT(
-                                f"已加载角色立绘: {chara_name}({chara_id}) - {draw_type} - {len(draw_image_list)}张", colors=(200, 220, 255))
-
-                        except Exception as e:
-                            self.PRINT(
-                                f"加载角色{chara_id}的{draw_type}立绘失败: {e}", colors=(255, 200, 200))
-                    else:
-                        self.PRINT(
-                            f"立绘数据文件不存在: {csv_path}", colors=(255, 200, 200))
-
-        self.PRINT(f"角色立绘加载完成，共{total_chara_images}张图片",
-                   colors=(200, 255, 200))
-
-        # 显示所有角色ID和对应的图片数量
-        self.PRINT_DIVIDER("-", 40, (150, 150, 150))
-        self.PRINT("角色立绘统计:", colors=(200, 200, 255))
-        for chara_id, draw_types in self.chara_images.items():
-            chara_name = self.init.charaters_key.get(
-                chara_id, {}).get('名前', f'角色{chara_id}')
-            total_for_chara = sum(len(images)
-                                  for images in draw_types.values())
-            self.PRINT(
-                f"  {chara_name}({chara_id}): {total_for_chara}张立绘", colors=(200, 200, 200))
-            for draw_type, images in draw_types.items():
-                self.PRINT(f"    {draw_type}: {len(images)}张",
-                           colors=(150, 150, 150))
-        self.PRINT_DIVIDER("-", 40, (150, 150, 150))
+            for draw in result['draws']:
+                draw_type = draw['draw_type']  # 例如："立绘", "表情绘", "服装绘"等
+                draw_image_list = []
+                for name, filename, x, y, width, height in draw['rows']:
+                    # 使用角色ID和立绘类型作为前缀，避免命名冲突
+                    prefixed_name = f"{chara_id}_{draw_type}_{name}"
+                    self.image_data[prefixed_name] = {
+                        'filename': filename,
+                        'base_dir': draw['base_dir'],  # 使用立绘目录作为基础目录
+                        'x': x,
+                        'y': y,
+                        'width': width,
+                        'height': height,
+                        'chara_id': chara_id,
+                        'draw_type': draw_type,  # 立绘类型
+                        'original_name': name  # 保留原始名称
+                    }
+                    draw_image_list.append(prefixed_name)
+
+                # 有最新的图集时，差分改为从图集中截取（每个立绘类型只读一个文件）
+                if draw['atlas']:
+                    self._apply_atlas(draw['atlas'], draw_image_list)
+
+                # 将立绘类型下的图片列表存储到字典中
+                self.chara_images[chara_id][draw_type] = draw_image_list
+                total_chara_images += len(draw_image_list)
+                manifest_count += 1
+
+            for csv_path in result['missing']:
+                problems.append(f"立绘数据文件不存在: {csv_path}")
+            for draw_type, error in result['errors']:
+                problems.append(f"加载角色{chara_id}的{draw_type}立绘失败: {error}")
+
+        ambiguous = self._build_image_indexes()
+
+        # 汇总输出，整段只呈现一帧
+        with self.batch():
+            if missing_charas:
+                self.PRINT(f"{len(missing_charas)}个角色没有立绘目录: "
+                           f"{', '.join(str(cid) for cid in missing_charas)}",
+                           colors=(255, 200, 200))
+            for problem in problems:
+                self.PRINT(problem, colors=(255, 200, 200))
+            self.PRINT(f"角色立绘加载完成，{len(self.chara_images)}个角色，{manifest_count}个清单，"
+                       f"共{total_chara_images}张图片（{'缓存' if from_cache else '扫描'}，"
+                       f"{elapsed_ms:.0f}ms）",
+                       colors=(200, 255, 200))
+
+            if ambiguous:
+                self.PRINT(f"警告: {len(ambiguous)}个图片名在多个角色/立绘类型中重复，"
+                           f"使用时需指定角色ID和立绘类型或完整名称:", colors=(255, 220, 150))
+                for original_name, names in list(ambiguous.items())[:10]:
+                    self.PRINT(f"  {original_name}: {', '.join(names)}", colors=(200, 200, 150))
+                if len(ambiguous) > 10:
+                    self.PRINT(f"  ... 还有{len(ambiguous) - 10}个", colors=(200, 200, 150))
+
+            # 显示所有角色ID和对应的图片数量（每个角色一行）
+            self.PRINT_DIVIDER("-", 40, (150, 150, 150))
+            self.PRINT("角色立绘统计:", colors=(200, 200, 255))
+            for chara_id, draw_types in self.chara_images.items():
+                chara_name = self.init.charaters_key.get(
+                    chara_id, {}).get('名前', f'角色{chara_id}')
+                total_for_chara = sum(len(images)
+                                      for images in draw_types.values())
+                detail = " / ".join(f"{draw_type} {len(images)}"
+                                    for draw_type, images in draw_types.items())
+                self.PRINT(f"  {chara_name}({chara_id}): {total_for_chara}张立绘"
+                           + (f"（{detail}）" if detail else ""), colors=(200, 200, 200))
+            self.PRINT_DIVIDER("-", 40, (150, 150, 150))
         # 在加载完成后，将图片信息注册到loader
-        for img_name, img_info in self.image_data.items():
-            full_path = os.path.join(
-                img_info['base_dir'], img_info['filename'])
-            self.loader.register_image_info(img_name, {
-                'path': full_path,
-                'original_width': img_info['width'],
-                'original_height': img_info['height'],
-                'chara_id': img_info.get('chara_id'),
-                'draw_type': img_info.get('draw_type')
-            })
+        for img_name in self.image_data:
+            self.loader.register_image_info(
+                img_name, self._get_image_info_dict(img_name))
 
     def _load_image_data(self):
         """加载所有角色的图片数据"""
@@ -600,8 +680,7 @@ class SimpleERAConsole:
         # 如果没有参数，处理空输出
         if not args:
             self.loader.add_text("")
-            self._draw_display()
-            pygame.display.flip()
+            self._request_present()
             return
 
         # 处理所有参数
@@ -636,20 +715,17 @@ class SimpleERAConsole:
         self.loader.add_inline_fragments(inline_fragments)
 
         # 刷新显示
-        self._draw_display()
-        pygame.display.flip()
+        self._request_present()
 
     def PRINT_MENU(self, items, colors=(200, 200, 255)):
         """输出菜单到控制台"""
         self.loader.add_menu(items, colors)
-        self._draw_display()
-        pygame.display.flip()
+        self._request_present()
 
     def PRINT_DIVIDER(self, char="─", length=40, colors=(150, 150, 150)):
         """输出分割线"""
         self.loader.add_divider(char, length, colors)
-        self._draw_display()
-        pygame.display.flip()
+        self._request_present()
 
     # main.py - 修复 INPUT 方法中的空行处理
 
@@ -657,124 +733,191 @@ class SimpleERAConsole:
             """获取用户输入 - 支持中文输入法 (IME)"""
             self.input_text = ""
             self.composition_text = ""  # [新增] 用来存正在输入的拼音/未确认文本
-            
+            self._input_dirty = True
+
+            # 开始等待输入前，把延迟的输出呈现出来，日志也趁空闲写盘
+            if self._present_pending:
+                self._present()
+            self.loader.flush_log()
+
+            # 回放队列中还有输入时直接返回，不进入事件循环
+            if self.input_replay is not None:
+                step = self.input_replay.next()
+                if step is not None:
+                    return self._replay_input(*step)
+                if self.headless:
+                    # 无界面模式下没有人能继续输入，脚本结束即退出
+                    print(f"输入脚本已回放完毕（{self.input_replay.consumed} 步）")
+                    self.quit()
+                    return None
+
             waiting_for_input = True
             pygame.key.start_text_input()
+            self._ime_rect = None
+            self._restart_cursor_blink()
                 
             # 计算输入框位置，用于定位输入法的选词框
             input_y = self.screen_height - self.input_area_height + 10
-            
-            while waiting_for_input and self.running:
-                # 2. 设置输入法候选框的位置跟随光标
-                # 计算当前文字宽度
-                current_width = self.font.size("> " + self.input_text + self.composition_text)[0]
-                # 设置选词框位置 (x, y, w, h)
-                pygame.key.set_text_input_rect(pygame.Rect(10 + current_width, input_y, 10, 30))
 
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        self.quit()
-                        return None
+            try:
+                while waiting_for_input and self.running:
+                    # 输入法候选框跟随光标（只在位置变化时重新设置）
+                    self._update_ime_rect(input_y)
+
+                    # 阻塞等待事件，没有输入时不占用 CPU；光标闪烁由定时器事件唤醒，
+                    # 后台还有图片在解码时定时醒来收取
+                    events = [pygame.event.wait(self._input_wait_timeout())]
+                    events.extend(pygame.event.get())
+                    for event in events:
+                        if self._handle_idle_event(event):
+                            continue
+
+                        if event.type == pygame.QUIT:
+                            self.quit()
+                            return None
                     
-                    # 处理动态加载器事件（滚动等）
-                    if self.loader.handle_event(event):
-                        self._draw_display()
-                        pygame.display.flip()
-                        continue
+                        # 处理动态加载器事件（滚动等），重绘由加载器的脏区域记录驱动
+                        if self.loader.handle_event(event):
+                            continue
                     
-                    # 处理鼠标点击
-                    elif event.type == pygame.MOUSEBUTTONDOWN:
-                        if event.button == 1:
-                            clicked_input = self._handle_mouse_click(event.pos)
-                            if clicked_input:
-                                pygame.key.stop_text_input() # 结束输入前关闭 IME
-                                return clicked_input
-                    elif event.type == pygame.TEXTEDITING:
-                        self.composition_text = event.text
-                    # [核心修改] 专门处理文本输入 (中文/英文/符号)
-                    elif event.type == pygame.TEXTINPUT:
-                        # event.text 包含了输入法确认后的最终文本
-                        self.input_text += event.text
-                        self.composition_text = "" # 确认后清空拼音区
-
-                    # [核心修改] 处理功能键 (回车、退格、方向键)
-                    # 改用 KEYDOWN 以获得更好的响应速度
-                    elif event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_RETURN:
-                            user_input = self.input_text
+                        # 处理鼠标点击
+                        elif event.type == pygame.MOUSEBUTTONDOWN:
+                            if event.button == 1:
+                                clicked_input = self._handle_mouse_click(event.pos)
+                                if clicked_input:
+                                    self._record_input(clicked_input, SOURCE_CLICK)
+                                    return clicked_input
+                        elif event.type == pygame.TEXTEDITING:
+                            self.composition_text = event.text
+                            self._restart_cursor_blink()
+                        # [核心修改] 专门处理文本输入 (中文/英文/符号)
+                        elif event.type == pygame.TEXTINPUT:
+                            # event.text 包含了输入法确认后的最终文本
+                            self.input_text += event.text
+                            self.composition_text = "" # 确认后清空拼音区
+                            self._restart_cursor_blink()
+
+                        # [核心修改] 处理功能键 (回车、退格、方向键)
+                        # 改用 KEYDOWN 以获得更好的响应速度
+                        elif event.type == pygame.KEYDOWN:
+                            if event.key == pygame.K_RETURN:
+                                user_input = self.input_text
                             
-                            # 保存到输入历史
-                            if user_input: # 只有非空才存历史，防止存入一堆空行
-                                self.input_history.append(user_input)
-                            self.input_history_index = -1
+                                # 保存到输入历史
+                                if user_input: # 只有非空才存历史，防止存入一堆空行
+                                    self.input_history.append(user_input)
+                                self.input_history_index = -1
                             
-                            # 显示用户输入
-                            self.loader.add_text(f"{user_input}", (255, 255, 200))
-                            self.loader.add_text("")  # 空行
+                                # 显示用户输入
+                                self.loader.add_text(f"{user_input}", (255, 255, 200))
+                                self.loader.add_text("")  # 空行
                             
-                            # 3. 结束输入时关闭 IME
-                            pygame.key.stop_text_input()
-                            self.composition_text = "" 
-                            self.input_text = ""
-                            waiting_for_input = False
-                            return user_input
+                                self.composition_text = "" 
+                                self.input_text = ""
+                                waiting_for_input = False
+                                self._record_input(user_input, SOURCE_KEY)
+                                return user_input
                         
-                        elif event.key == pygame.K_BACKSPACE:
-                            if not self.composition_text:
-                                self.input_text = self.input_text[:-1]
+                            elif event.key == pygame.K_BACKSPACE:
+                                if not self.composition_text:
+                                    self.input_text = self.input_text[:-1]
+                                    self._restart_cursor_blink()
                         
-                        elif event.key == pygame.K_UP:
-                            # 向上浏览输入历史
-                            if self.input_history:
-                                if self.input_history_index < len(self.input_history) - 1:
-                                    self.input_history_index += 1
-                                    self.input_text = self.input_history[-(self.input_history_index + 1)]
+                            elif event.key == pygame.K_UP:
+                                # 向上浏览输入历史
+                                if self.input_history:
+                                    if self.input_history_index < len(self.input_history) - 1:
+                                        self.input_history_index += 1
+                                        self.input_text = self.input_history[-(self.input_history_index + 1)]
+                                        self._input_dirty = True
                         
-                        elif event.key == pygame.K_DOWN:
-                            # 向下浏览输入历史
-                            if self.input_history_index > 0:
-                                self.input_history_index -= 1
-                                self.input_text = self.input_history[-(self.input_history_index + 1)]
-                            elif self.input_history_index == 0:
-                                self.input_history_index = -1
-                                self.input_text = ""
-                
-                # 绘制界面
-                self.screen.fill((0, 0, 0)) # 记得先清屏
-                self.loader.draw(self.screen)
-                # [修改] 绘制输入框：显示 "已确认文本" + "下划线拼音"
-                # 拼音部分用不同的颜色（比如灰色或带下划线）以示区别
-                display_text = "> " + self.input_text
-                base_surface = self.font.render(display_text, True, (255, 255, 255))
-                self.screen.blit(base_surface, (10, input_y))
-                
-                # 绘制正在输入的拼音（如果有）
-                if self.composition_text:
-                    comp_x = 10 + base_surface.get_width()
-                    comp_surface = self.font.render(self.composition_text, True, (150, 255, 150)) # 绿色拼音
-                    self.screen.blit(comp_surface, (comp_x, input_y))
-                    # 画个下划线表示正在输入
-                    pygame.draw.line(self.screen, (150, 255, 150), 
-                                (comp_x, input_y + 25), 
-                                (comp_x + comp_surface.get_width(), input_y + 25), 1)
-                if self.cursor_visible:
-                    # 光标在拼音后面
-                    total_text = "> " + self.input_text + self.composition_text
-                    cursor_x = 10 + self.font.size(total_text)[0]
-                    pygame.draw.line(self.screen, (255, 255, 255), (cursor_x, input_y), (cursor_x, input_y + 20), 2)
-                # 光标闪烁
-                self.cursor_timer += 1
-                if self.cursor_timer > 30:
-                    self.cursor_visible = not self.cursor_visible
-                    self.cursor_timer = 0
-                
-                pygame.display.flip()
-                pygame.time.Clock().tick(60)
+                            elif event.key == pygame.K_DOWN:
+                                # 向下浏览输入历史
+                                if self.input_history_index > 0:
+                                    self.input_history_index -= 1
+                                    self.input_text = self.input_history[-(self.input_history_index + 1)]
+                                elif self.input_history_index == 0:
+                                    self.input_history_index = -1
+                                    self.input_text = ""
+                                self._input_dirty = True
+
+
+                    # 只推送变化的区域（内容区 / 输入行），没有变化时不触碰屏幕；最小化时不绘制
+                    if not self._window_minimized:
+                        self._present()
+                    # 事件密集时（例如连续滚动）限制重绘帧率
+                    self.clock.tick(self.max_fps)
             
-            # 确保退出循环时关闭 IME
-            pygame.key.stop_text_input()
+            finally:
+                # 退出等待时停止光标定时器并关闭 IME
+                self._stop_cursor_blink()
+                if pygame.get_init():
+                    pygame.key.stop_text_input()
             return None
 
+    def _input_wait_timeout(self):
+        """等待事件的超时（毫秒，0 表示一直等到有事件）"""
+        if self.loader.images_in_flight():
+            # 失去焦点时降低收取频率
+            return 1000 // self.max_fps if self._window_focused else 250
+        return 0
+
+    def _update_ime_rect(self, input_y):
+        """输入法候选框跟随光标，位置没变时不重复设置"""
+        current_width = self.font.size("> " + self.input_text + self.composition_text)[0]
+        rect = (10 + current_width, input_y, 10, 30)
+        if rect != self._ime_rect:
+            self._ime_rect = rect
+            pygame.key.set_text_input_rect(pygame.Rect(rect))
+
+    def _restart_cursor_blink(self):
+        """输入变化后光标保持显示，重新开始闪烁计时；窗口不活动时不闪烁"""
+        self.cursor_visible = True
+        self._input_dirty = True
+        if self._window_focused and not self._window_minimized:
+            pygame.time.set_timer(CURSOR_BLINK_EVENT, self.cursor_blink_ms)
+        else:
+            self._stop_cursor_blink()
+
+    def _stop_cursor_blink(self):
+        if pygame.get_init():
+            pygame.time.set_timer(CURSOR_BLINK_EVENT, 0)
+
+    def _handle_idle_event(self, event):
+        """
+        处理等待输入时的空闲类事件：超时、光标闪烁、窗口焦点与最小化
+
+        Returns:
+            事件是否已处理
+        """
+        if event.type == pygame.NOEVENT:
+            return True
+        if event.type == CURSOR_BLINK_EVENT:
+            self.cursor_visible = not self.cursor_visible
+            self._input_dirty = True
+            return True
+        if event.type == pygame.WINDOWFOCUSLOST:
+            # 失去焦点：停止闪烁，没有事件时完全不唤醒
+            self._window_focused = False
+            self._restart_cursor_blink()
+            return True
+        if event.type == pygame.WINDOWFOCUSGAINED:
+            self._window_focused = True
+            self._restart_cursor_blink()
+            return True
+        if event.type == pygame.WINDOWMINIMIZED:
+            self._window_minimized = True
+            self._stop_cursor_blink()
+            return True
+        if event.type in (pygame.WINDOWRESTORED, pygame.WINDOWEXPOSED):
+            # 窗口内容可能已被系统丢弃，整屏重绘一次
+            self._window_minimized = False
+            self.loader.request_full_redraw()
+            if event.type == pygame.WINDOWRESTORED:
+                self._restart_cursor_blink()
+            return True
+        return False
+
     def _init_background_music(self):
         """初始化背景音乐 - 从global_key['musicbox']获取音乐列表"""
         try:
@@ -811,23 +954,139 @@ class SimpleERAConsole:
         except Exception as e:
             self.PRINT(f"初始化音乐失败: {e}", colors=(255, 200, 200))
 
+    @contextmanager
+    def batch(self):
+        """
+        批量输出：块内的 PRINT 只追加内容，退出时统一呈现一帧
+
+        用法:
+            with console.batch():
+                for line in lines:
+                    console.PRINT(line)
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._present_pending:
+                self._present()
+
+    def _request_present(self):
+        """
+        输出后请求呈现
+
+        延迟呈现模式下同一个显示周期内只呈现一次，剩下的留到下一次到期的
+        _request_present / flush_present / pump、事件结束、batch() 结束或 INPUT 开始等待时再呈现
+        """
+        if self._batch_depth > 0:
+            self._present_pending = True
+            return
+        if not self.coalesce_present or self._present_due():
+            self._present()
+        else:
+            self._present_pending = True
+
+    def _present_due(self):
+        """距上次呈现是否已满一个显示周期"""
+        return time.perf_counter() - self._last_present_time >= self.present_interval
+
+    def flush_present(self, force=False):
+        """
+        把被节流推迟的输出呈现出来
+
+        Args:
+            force: False 时只在距上次呈现满一个显示周期后呈现
+        """
+        if (self._present_pending and self._batch_depth == 0
+                and (force or self._present_due())):
+            self._present()
+
+    def pump(self):
+        """
+        不经过 INPUT 的长循环（动画、脚本演示）每帧调用一次，代替 pygame.event.get：
+        到期的延迟输出会被呈现，返回取到的窗口事件
+        """
+        events = pygame.event.get()
+        self.flush_present()
+        return events
+
+    def sleep(self, seconds):
+        """先呈现延迟的输出再等待，避免等待期间屏幕停在上一帧"""
+        self.flush_present(force=True)
+        time.sleep(seconds)
+
+    def _present(self, full=False):
+        """
+        把界面变化推送到屏幕
+
+        脏区域模式下只重绘并 update 变化的矩形（内容区、输入行）；
+        加载器要求整屏重绘（滚动、换字体）或关闭脏区域模式时退回 fill + flip
+        """
+        self._present_pending = False
+        self._last_present_time = time.perf_counter()
+
+        # 后台解码完成的图片会把内容区标脏
+        self.loader.poll_images()
+
+        loader_full, rects = self.loader.consume_dirty()
+        if full or loader_full or not self.dirty_rects_enabled:
+            self._draw_display()
+            if not self.headless:
+                pygame.display.flip()
+            self._input_dirty = False
+            return
+
+        update_rects = []
+        if rects:
+            area = rects[0].unionall(rects[1:])
+            self.screen.set_clip(area)
+            self.screen.fill((0, 0, 0))
+            self._draw_content()
+            self.screen.set_clip(None)
+            update_rects.append(area)
+
+        if self._input_dirty:
+            self.screen.fill((0, 0, 0), self.input_rect)
+            self._draw_input_line()
+            update_rects.append(self.input_rect)
+            self._input_dirty = False
+
+        if update_rects and not self.headless:
+            pygame.display.update(update_rects)
+
     def _draw_display(self):
         """绘制整个界面"""
         # 清屏
         self.screen.fill((0, 0, 0))
 
         # 绘制动态加载器的内容
-        self.loader.draw(self.screen)
+        self._draw_content()
 
         # 绘制输入文本和光标（始终在左下角）
-        input_y = self.screen_height - self.input_area_height + 10
-        input_surface = self.font.render(
-            "> " + self.input_text, True, (255, 255, 255))
-        self.screen.blit(input_surface, (10, input_y))
-
-        # 绘制光标
+        self._draw_input_line()
+
+    def _draw_input_line(self):
+        """绘制输入框：显示 "已确认文本" + "下划线拼音" + 光标"""
+        input_y = self.input_y
+        base_surface = self.loader.render_text(
+            "> " + self.input_text, (255, 255, 255))
+        self.screen.blit(base_surface, (10, input_y))
+
+        # 绘制正在输入的拼音（如果有），用绿色和下划线以示区别
+        if self.composition_text:
+            comp_x = 10 + base_surface.get_width()
+            comp_surface = self.loader.render_text(
+                self.composition_text, (150, 255, 150))
+            self.screen.blit(comp_surface, (comp_x, input_y))
+            pygame.draw.line(self.screen, (150, 255, 150),
+                             (comp_x, input_y + 25),
+                             (comp_x + comp_surface.get_width(), input_y + 25), 1)
+
+        # 绘制光标（在拼音后面）
         if self.cursor_visible:
-            cursor_x = 10 + self.font.size("> " + self.input_text)[0]
+            total_text = "> " + self.input_text + self.composition_text
+            cursor_x = 10 + self.font.size(total_text)[0]
             pygame.draw.line(
                 self.screen,
                 (255, 255, 255),
@@ -836,19 +1095,23 @@ class SimpleERAConsole:
                 2
             )
 
+    def _draw_content(self):
+        """绘制内容区：历史记录、滚动条和滚动提示"""
+        self.loader.draw(self.screen)
+
         # 绘制滚动提示
         scroll_info = self.loader.get_scroll_info()
         if scroll_info["total_items"] > scroll_info["visible_items"]:
             # 显示滚动位置信息
             scroll_text = f"行: {scroll_info['total_items'] - scroll_info['scroll_offset'] - scroll_info['visible_items'] + 1}-{scroll_info['total_items'] - scroll_info['scroll_offset']} / {scroll_info['total_items']}"
-            info_surface = self.font.render(scroll_text, True, (150, 150, 150))
+            info_surface = self.loader.render_text(scroll_text, (150, 150, 150))
             info_x = self.screen_width - info_surface.get_width() - 20
             self.screen.blit(info_surface, (info_x, self.screen_height - 60))
 
             # 显示滚动提示
             if not scroll_info["at_bottom"]:
-                hint_surface = self.font.render(
-                    "↑ 滚动查看历史", True, (100, 150, 255))
+                hint_surface = self.loader.render_text(
+                    "↑ 滚动查看历史", (100, 150, 255))
                 self.screen.blit(
                     hint_surface, (self.screen_width - hint_surface.get_width() - 20, 10))
 
@@ -866,56 +1129,142 @@ class SimpleERAConsole:
         self.PRINT(f"总行数: {scroll_info['total_items']}", (200, 200, 200))
         self.PRINT(f"可见行数: {scroll_info['visible_items']}", (200, 200, 200))
         self.PRINT(f"滚动偏移: {scroll_info['scroll_offset']}", (200, 200, 200))
+        self.PRINT(
+            f"滚动像素: {scroll_info['scroll_px']} / {scroll_info['max_scroll_px']}", (200, 200, 200))
         self.PRINT(
             f"是否在顶部: {'是' if scroll_info['at_top'] else '否'}", (200, 200, 200))
         self.PRINT(
             f"是否在底部: {'是' if scroll_info['at_bottom'] else '否'}", (200, 200, 200))
         self.PRINT_DIVIDER("=", 40)
 
-    def init_all(self):
-        """初始化所有组件，包括数据和音乐"""
+    def init_all(self, event_manager=None):
+        """
+        分阶段初始化所有组件，包括数据和音乐
+
+        窗口先显示加载进度，CSV 数据、立绘清单和事件在后台线程加载，
+        全部就绪后在主线程合并结果、输出汇总并报告各阶段耗时。
+
+        Args:
+            event_manager: 以 load=False 创建的 EventManager，传入时事件也放到后台加载
+        """
         try:
             from init import initall
-            init = initall("./csv/")
-            self.init = init  # 这里设置self.init属性
 
             # 使用动态加载器输出
             self.loader.add_divider("=", 60, (100, 200, 100))
             self.loader.add_text("少女祈祷中...", (200, 255, 200))
 
-            for i in init.charaters_key:
-                chara_name = init.charaters_key[i].get('名前', '未知角色')
-                self.loader.add_text(f"已加载角色：{chara_name}", (200, 220, 255))
+            pipeline = StartupPipeline()
+            pipeline.add("csv", "读取CSV数据", lambda: initall("./csv/"))
+            pipeline.add("manifests", "扫描立绘清单", self._scan_chara_manifests, deps=("csv",))
+            if event_manager is not None:
+                # 后台线程不能 PRINT，事件加载信息先存起来
+                event_manager.defer_output = True
+                pipeline.add("events", "加载事件", event_manager.load_events)
+            try:
+                self._run_startup(pipeline)
+            finally:
+                if event_manager is not None:
+                    event_manager.defer_output = False
 
-            time.sleep(1)
-            self.loader.add_text("角色全部载入~", (100, 255, 100))
+            init = pipeline.result("csv")
+            self.init = init  # 这里设置self.init属性
+            manifests, from_cache = pipeline.result("manifests")
+            if event_manager is not None:
+                pipeline.result("events")
 
-            # 初始化图片数据字典
-            self.image_data, self.chara_images = self._load_image_data()
+            with self.batch():
+                for i in init.charaters_key:
+                    chara_name = init.charaters_key[i].get('名前', '未知角色')
+                    self.loader.add_text(f"已加载角色：{chara_name}", (200, 220, 255))
+                self.loader.add_text("角色全部载入~", (100, 255, 100))
 
-            # 加载所有角色的立绘数据
-            self._load_all_chara_images()
+                # 初始化图片数据字典，合并后台扫描的立绘清单
+                self.image_data, self.chara_images = self._load_image_data()
+                self._apply_chara_manifests(
+                    manifests, from_cache, pipeline.timings()["manifests"])
 
-            for i in init.global_key:
-                self.loader.add_text(f"已加载全局设置：{i}", (200, 200, 255))
+                if event_manager is not None:
+                    event_manager.flush_output()
 
-            time.sleep(1)
-            self.loader.add_text("全部载入~", (100, 255, 100))
-            self.loader.add_divider("=", 60, (100, 200, 100))
+                for i in init.global_key:
+                    self.loader.add_text(f"已加载全局设置：{i}", (200, 200, 255))
 
-            # 初始化背景音乐
-            self._init_background_music()
+                self.loader.add_text("全部载入~", (100, 255, 100))
+                self._report_startup_timings(pipeline)
+                self.loader.add_divider("=", 60, (100, 200, 100))
+
+                # 初始化背景音乐
+                self._init_background_music()
 
             # 滚动到底部
             self.loader.scroll_to_bottom()
 
             return init
         except Exception as e:
+            if event_manager is not None:
+                event_manager.flush_output()
             self.PRINT(f"初始化失败: {e}", colors=(255, 200, 200))
             self.PRINT("按任意键继续...")
             self.INPUT()
             return None
 
+    def _run_startup(self, pipeline):
+        """运行启动阶段，等待期间在主线程处理窗口事件并刷新进度"""
+        frame_interval = 0.1  # 进度刷新间隔（秒），刷新太勤会和后台线程争抢 GIL
+        pipeline.start()
+        try:
+            finished = False
+            while not finished:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        pipeline.shutdown()
+                        self.quit()
+                self._draw_startup_progress(pipeline)
+                finished = pipeline.wait(frame_interval)
+        finally:
+            pipeline.shutdown()
+
+    def _draw_startup_progress(self, pipeline):
+        """绘制启动进度：已有的输出内容 + 输入行上方的阶段列表"""
+        if self.first_frame_ms is None:
+            self.first_frame_ms = (time.perf_counter() - self._created_at) * 1000
+
+        self.screen.fill((0, 0, 0))
+        self._draw_content()
+
+        now = time.perf_counter()
+        line_height = self.font.get_linesize()
+        y = self.input_y - line_height * len(pipeline.stages) - 10
+        for stage in pipeline.stages.values():
+            if stage.state == STAGE_DONE:
+                text, color = f"[完成] {stage.label} {stage.elapsed * 1000:.0f}ms", (100, 255, 100)
+            elif stage.state == STAGE_FAILED:
+                text, color = f"[失败] {stage.label}: {stage.error}", (255, 200, 200)
+            elif stage.state == STAGE_RUNNING and stage.started is not None:
+                text, color = f"[进行中] {stage.label} {(now - stage.started) * 1000:.0f}ms", (200, 220, 255)
+            else:
+                text, color = f"[等待] {stage.label}", (150, 150, 150)
+            self.screen.blit(self.loader.render_text(text, color), (10, y))
+            y += line_height
+
+        if not self.headless:
+            pygame.display.flip()
+
+    def _report_startup_timings(self, pipeline):
+        """输出各启动阶段的耗时，并保存在 startup_timings 中"""
+        timings = pipeline.timings()
+        self.startup_timings = dict(timings)
+        self.startup_timings["total"] = pipeline.elapsed * 1000
+        self.startup_timings["first_frame"] = self.first_frame_ms
+
+        parts = [f"{pipeline.stages[name].label} {ms:.0f}ms"
+                 for name, ms in timings.items() if ms is not None]
+        parts.append(f"后台合计 {pipeline.elapsed * 1000:.0f}ms")
+        if self.first_frame_ms is not None:
+            parts.append(f"首帧 {self.first_frame_ms:.0f}ms")
+        self.PRINT("启动耗时: " + " · ".join(parts), colors=(150, 200, 150))
+
     def quit(self):
         """退出程序"""
         # 停止音乐
@@ -929,10 +1278,13 @@ class SimpleERAConsole:
             f"会话日志已保存到: {self.loader.log_file}", (200, 200, 200))
 
         # 短暂显示退出信息
-        self._draw_display()
-        pygame.display.flip()
-        pygame.time.delay(1000)
+        self._present(full=True)
+        if not self.headless:
+            pygame.time.delay(1000)
 
         self.running = False
+        if self.input_recorder is not None:
+            self.input_recorder.close()
+        self.loader.close()
         pygame.quit()
         sys.exit()
\ No newline at end of file
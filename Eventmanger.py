@@ -1,5 +1,5 @@
 class EventManager:
-    def __init__(self, console_instance):
+    def __init__(self, console_instance, load=True):
         self.console = console_instance
         self.events = {}
         self.eventid = {}
@@ -8,8 +8,27 @@ class EventManager:
         # [新增] 存储事件的元数据（比如是否为主事件）
         # 结构: {'事件名': {'is_main': True, ...}}
         self.events_meta = {} 
+
+        # 延迟输出：后台线程加载事件时不能直接 PRINT，先存起来由主线程 flush_output 输出
+        self.defer_output = False
+        self._pending_output = []
         
-        self.load_events()
+        # load=False 时由调用者稍后自行调用 load_events（例如放到启动线程里）
+        if load:
+            self.load_events()
+
+    def _print(self, text, colors=None):
+        if self.defer_output:
+            self._pending_output.append((text, colors))
+        else:
+            self.console.PRINT(text, colors=colors)
+
+    def flush_output(self):
+        """在主线程输出延迟期间积攒的信息"""
+        pending, self._pending_output = self._pending_output, []
+        with self.console.batch():
+            for text, colors in pending:
+                self.console.PRINT(text, colors=colors)
 
     def load_events(self, is_reload=False):
             """动态加载事件文件 (兼容 PyInstaller 打包)"""
@@ -33,7 +52,7 @@ class EventManager:
                 sys.path.insert(0, root_dir)
 
             if not os.path.exists(events_dir):
-                self.console.PRINT(f"警告: 未找到事件目录 {events_dir}", colors=(255, 100, 100))
+                self._print(f"警告: 未找到事件目录 {events_dir}", colors=(255, 100, 100))
                 return # 或者 os.makedirs(events_dir)
 
             # [修改] 重载清理逻辑
@@ -46,7 +65,7 @@ class EventManager:
                 for m in modules_to_remove:
                     del sys.modules[m]
                 
-                self.console.PRINT("正在清理旧事件缓存...", colors=(150, 150, 150))
+                self._print("正在清理旧事件缓存...", colors=(150, 150, 150))
 
             # 3. 遍历文件
             for root, dirs, files in os.walk(events_dir):
@@ -92,15 +111,15 @@ class EventManager:
                                     
                                     if not is_reload:
                                         tag = "[主]" if is_main else ""
-                                        self.console.PRINT(f"已加载事件: {event_key} {tag}")
+                                        self._print(f"已加载事件: {event_key} {tag}")
                                         
                         except Exception as e:
                             # 打印详细错误方便调试
                             print(f"Failed to load {module_name}: {e}") 
-                            self.console.PRINT(f"加载失败 {module_name}: {e}", colors=(255, 200, 200))
+                            self._print(f"加载失败 {module_name}: {e}", colors=(255, 200, 200))
             
             if is_reload:
-                self.console.PRINT(f"重载完成，当前共有 {len(self.events)} 个事件。", colors=(100, 255, 100))
+                self._print(f"重载完成，当前共有 {len(self.events)} 个事件。", colors=(100, 255, 100))
 
     def trigger_event(self, event_name, things_instance,silent=False):
             if event_name in self.events:
@@ -117,6 +136,8 @@ class EventManager:
                     return None
                 finally:
                     if self.call_stack: self.call_stack.pop()
+                    # 事件结束后把节流推迟的最后一帧呈现出来，不必等到下一次 INPUT
+                    self.console.flush_present(force=True)
             else:
                 # 只有真的不在字典里，才报未找到
                 if not silent:
@@ -0,0 +1,165 @@
+# chara_manifest.py - 角色立绘清单的并行扫描与磁盘缓存
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sprite_atlas import read_manifest, load_atlas, atlas_paths
+
+MANIFEST_CACHE_VERSION = 1
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_chara(img_root, chara_id):
+    """
+    扫描一个角色目录 <img_root>/<角色id>/ 下所有以“绘”结尾的立绘目录
+
+    Returns:
+        {
+            'chara_id': 角色ID,
+            'exists': 角色目录是否存在,
+            'draws': [{'draw_type', 'base_dir', 'rows', 'atlas'}, ...]（按目录名排序）,
+            'missing': [不存在的清单路径, ...],
+            'errors': [[立绘类型, 错误信息], ...],
+            'mtimes': {依赖的路径: 修改时间}，用于判断缓存是否过期
+        }
+    """
+    chara_dir = os.path.join(img_root, str(chara_id))
+    result = {'chara_id': chara_id, 'exists': False, 'draws': [],
+              'missing': [], 'errors': [], 'mtimes': {}}
+    mtimes = result['mtimes']
+    mtimes[chara_dir] = _mtime(chara_dir)
+    if mtimes[chara_dir] is None:
+        return result
+    result['exists'] = True
+
+    try:
+        with os.scandir(chara_dir) as it:
+            draw_dirs = sorted(entry.name for entry in it
+                               if entry.name.endswith('绘') and entry.is_dir())
+    except OSError as e:
+        result['errors'].append(['', str(e)])
+        return result
+
+    for draw_type in draw_dirs:
+        draw_dir = os.path.join(chara_dir, draw_type)
+        csv_path = os.path.join(draw_dir, f"{chara_id}.csv")
+        # 目录的修改时间覆盖文件的增删（例如新生成了图集），文件本身的修改时间覆盖内容改动
+        mtimes[draw_dir] = _mtime(draw_dir)
+        mtimes[csv_path] = _mtime(csv_path)
+        if mtimes[csv_path] is None:
+            result['missing'].append(csv_path)
+            continue
+        try:
+            rows = read_manifest(csv_path)
+        except (OSError, UnicodeDecodeError) as e:
+            result['errors'].append([draw_type, str(e)])
+            continue
+
+        atlas = load_atlas(draw_dir, chara_id)
+        for path in atlas_paths(draw_dir, chara_id):
+            mtimes[path] = _mtime(path)
+        if atlas:
+            for filename in atlas.get('sources', {}):
+                path = os.path.join(draw_dir, filename)
+                mtimes[path] = _mtime(path)
+            atlas = {'image': atlas['image'], 'entries': atlas['entries']}
+
+        result['draws'].append({
+            'draw_type': draw_type,
+            'base_dir': draw_dir,
+            'rows': [list(row) for row in rows],
+            'atlas': atlas,
+        })
+    return result
+
+
+class ManifestCache:
+    """
+    把所有角色的扫描结果存成一个 JSON 文件
+
+    - 记录扫描时依赖的每个目录/清单/图集的修改时间，任一变化（含新建、删除）即整体失效
+    - 热启动只需对这些路径各做一次 stat，不再 listdir 和解析清单
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, img_root, chara_ids):
+        """返回缓存的扫描结果列表；没有缓存或已过期时返回 None"""
+        if not self.path:
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (data.get('version') != MANIFEST_CACHE_VERSION
+                or data.get('img_root') != img_root
+                or data.get('chara_ids') != [str(cid) for cid in chara_ids]):
+            return None
+        for result in data.get('charas', []):
+            for path, mtime in result['mtimes'].items():
+                if _mtime(path) != mtime:
+                    return None
+        return data['charas']
+
+    def save(self, img_root, chara_ids, results):
+        if not self.path:
+            return
+        data = {
+            'version': MANIFEST_CACHE_VERSION,
+            'img_root': img_root,
+            'chara_ids': [str(cid) for cid in chara_ids],
+            'charas': results,
+        }
+        cache_dir = os.path.dirname(self.path)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            # 先写临时文件再替换，中途退出不会留下半个缓存
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"写入立绘清单缓存失败: {e}")
+
+
+def load_chara_manifests(chara_ids, img_root="./img", workers=4, cache_path=None):
+    """
+    读取所有角色的立绘清单
+
+    缓存有效时直接返回缓存内容，否则用线程池并行扫描各角色目录并写回缓存。
+
+    Args:
+        chara_ids: 角色ID列表，结果与其顺序一致
+        img_root: 立绘根目录
+        workers: 扫描线程数，<=1 时在当前线程顺序扫描
+        cache_path: 缓存文件路径，空值表示不使用缓存
+
+    Returns:
+        (scan_chara 结果列表, 是否来自缓存)
+    """
+    chara_ids = list(chara_ids)
+    cache = ManifestCache(cache_path)
+    results = cache.load(img_root, chara_ids)
+    if results is not None:
+        return results, True
+
+    if workers and workers > 1 and len(chara_ids) > 1:
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="manifest-loader") as executor:
+            results = list(executor.map(lambda cid: scan_chara(img_root, cid), chara_ids))
+    else:
+        results = [scan_chara(img_root, cid) for cid in chara_ids]
+
+    cache.save(img_root, chara_ids, results)
+    return results, False
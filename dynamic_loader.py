@@ -3,9 +3,14 @@ import pygame
 import os
 import json
 import time
+from bisect import bisect_left, bisect_right
 from typing import List, Tuple, Dict, Optional
 from enum import Enum
-from collections import OrderedDict
+from render_cache import SurfaceCache, surface_bytes
+from text_wrap import TextWrapper
+from image_loader import AsyncImageLoader
+from pixel_cache import PixelCache
+from session_logger import SessionLogger
 # 在dynamic_loader.py中修改InlineFragment类
 
 
@@ -38,52 +43,118 @@ class InlineFragment:
 
         return self.width
 
-    def render_image(self):
-        """渲染图片（如果是图片标记）"""
+    def image_path(self):
+        """图片标记对应的文件路径"""
+        return os.path.join(self.img_info.get('base_dir', './'),
+                            self.img_info.get('filename', ''))
+
+    def render_image(self, loader=None):
+        """
+        渲染图片（如果是图片标记）
+
+        传入 loader 时走加载器的原图缓存和裁剪/缩放缓存，不会每帧读硬盘。
+        """
         if not self.is_image_mark or not self.img_info:
             return None
 
         try:
-            img_path = os.path.join(self.img_info.get('base_dir', './'),
-                                    self.img_info.get('filename', ''))
-
-            if not os.path.exists(img_path):
-                return None
+            img_path = self.image_path()
 
-            image = pygame.image.load(img_path).convert_alpha()
-
-            # 裁剪
+            # 裁剪区域和目标尺寸
             clip_x, clip_y = self.clip_pos if self.clip_pos else (0, 0)
-            clip_width = self.img_info.get('width', 270)
-            clip_height = self.img_info.get('height', 270)
-
-            # 确保裁剪区域有效
-            img_width, img_height = image.get_size()
-            if clip_x + clip_width > img_width:
-                clip_width = img_width - clip_x
-            if clip_y + clip_height > img_height:
-                clip_height = img_height - clip_y
-
-            if clip_width > 0 and clip_height > 0:
-                clip_rect = pygame.Rect(
-                    clip_x, clip_y, clip_width, clip_height)
-                clipped_image = image.subsurface(clip_rect)
-            else:
-                return None
+            clip = (clip_x, clip_y,
+                    self.img_info.get('width', 270), self.img_info.get('height', 270))
+            size = tuple(self.size) if self.size else None
 
-            # 调整大小
-            if self.size:
-                target_width, target_height = self.size
-                clipped_image = pygame.transform.scale(
-                    clipped_image, (target_width, target_height))
+            if loader is not None:
+                return loader.get_image_variant(img_path, clip, size)
 
-            return clipped_image
+            # 没有加载器时直接从硬盘读取（不缓存）
+            if not os.path.exists(img_path):
+                return None
+            image = pygame.image.load(img_path).convert_alpha()
+            return DynamicLoader._make_variant(image, clip, size, False)
 
         except Exception as e:
             print(f"渲染行内图片失败: {e}")
             return None
 
 
+class ImageLayer:
+    """
+    图片叠加中的一个图层
+
+    PRINTIMG 直接构造图层交给 DynamicLoader.add_image_stack，
+    不再拼成 [IMG_STACK:...] 字符串再由 parse_image_stack_mark 解析回来。
+    """
+
+    __slots__ = ('name', 'path', 'clip_x', 'clip_y', 'width', 'height',
+                 'target_width', 'target_height', 'offset_x', 'offset_y',
+                 'click_value', 'chara_id', 'draw_type')
+
+    def __init__(self, name, path, clip=(0, 0), source_size=(None, None), size=None,
+                 offset=(0, 0), click_value=None, chara_id=None, draw_type=None):
+        """
+        Args:
+            name: 图片名（用于日志和点击区域说明）
+            path: 图片文件路径
+            clip: 在源图片中的裁剪起点 (x, y)
+            source_size: 裁剪区域的宽高，None 表示到图片边缘
+            size: 缩放后的尺寸 (w, h)，None 表示不缩放
+            offset: 在模板中的偏移 (x, y)
+        """
+        self.name = name
+        self.path = path
+        self.clip_x, self.clip_y = clip
+        self.width, self.height = source_size
+        self.target_width, self.target_height = size if size else (None, None)
+        self.offset_x, self.offset_y = offset
+        self.click_value = click_value
+        self.chara_id = chara_id
+        self.draw_type = draw_type
+
+    @classmethod
+    def from_info(cls, name, info, clip=None, size=None, offset=None,
+                  click_value=None, chara_id=None, draw_type=None):
+        """由图片注册信息构造图层，传入的 clip/size/offset 等覆盖信息中的值"""
+        return cls(
+            name, info.get('path'),
+            clip=clip or (info.get('clip_x', 0), info.get('clip_y', 0)),
+            source_size=(info.get('original_width'), info.get('original_height')),
+            size=size or (info.get('target_width'), info.get('target_height')),
+            offset=offset or (info.get('offset_x', 0), info.get('offset_y', 0)),
+            click_value=click_value or info.get('click_value'),
+            chara_id=chara_id or info.get('chara_id'),
+            draw_type=draw_type or info.get('draw_type'))
+
+    @property
+    def clip(self):
+        """变体缓存使用的裁剪区域 (x, y, 宽, 高)"""
+        return (self.clip_x, self.clip_y, self.width, self.height)
+
+    @property
+    def size(self):
+        return (self.target_width, self.target_height)
+
+    @property
+    def offset(self):
+        return (self.offset_x, self.offset_y)
+
+    @property
+    def display_height(self):
+        """图层在模板中的高度（未缩放时为裁剪高度）"""
+        if self.target_height is not None:
+            return self.target_height
+        return self.height if self.height is not None else 270
+
+    def cache_key(self):
+        return (self.path, self.clip_x, self.clip_y, self.width, self.height,
+                self.target_width, self.target_height, self.offset_x, self.offset_y)
+
+    def __repr__(self):
+        return f"ImageLayer({self.name!r}, {self.path!r})"
+
+
 class ContentType(Enum):
     TEXT = "text"
     IMAGE = "image"
@@ -104,6 +175,7 @@ class ConsoleContent:
         self.height = height
         self.metadata = metadata or {}
         self.timestamp = time.time()
+        self.regions = []  # 该项目拥有的可点击区域，随项目一起被淘汰
 
         # 行内片段（用于支持同一行内的多个部分）
         self.fragments = fragments or []
@@ -125,11 +197,141 @@ class ConsoleContent:
         return f"ConsoleContent(type={self.type}, text={self.get_full_text()[:50]})"
 
 
+class HistoryBuffer:
+    """
+    历史记录环形缓冲区
+
+    按下标访问、切片、追加、从头部淘汰都是 O(1)（切片为 O(切片长度)），
+    满了之后自动扩容；容量上限由 DynamicLoader 通过 popleft 淘汰来保证。
+    """
+
+    def __init__(self, items=()):
+        self._buf = [None] * 64
+        self._start = 0
+        self._size = 0
+        for item in items:
+            self.append(item)
+
+    def append(self, item):
+        if self._size == len(self._buf):
+            self._grow()
+        self._buf[(self._start + self._size) % len(self._buf)] = item
+        self._size += 1
+
+    def popleft(self):
+        if not self._size:
+            raise IndexError("pop from an empty HistoryBuffer")
+        item = self._buf[self._start]
+        self._buf[self._start] = None  # 释放引用
+        self._start = (self._start + 1) % len(self._buf)
+        self._size -= 1
+        return item
+
+    def _grow(self):
+        self._buf = list(self) + [None] * len(self._buf)
+        self._start = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        buf, cap = self._buf, len(self._buf)
+        for i in range(self._size):
+            yield buf[(self._start + i) % cap]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._size)
+            cap = len(self._buf)
+            return [self._buf[(self._start + i) % cap] for i in range(start, stop, step)]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("HistoryBuffer index out of range")
+        return self._buf[(self._start + index) % len(self._buf)]
+
+    def copy(self):
+        """返回当前内容的列表快照"""
+        return list(self)
+
+
+class HeightIndex:
+    """
+    历史记录的累计高度索引（前缀和）
+
+    _ends 中保存每一项底边的绝对 y 坐标，坐标从第一次追加开始累计，
+    从头部淘汰项目不会改变其余项目的绝对坐标。因此追加、头部淘汰都是 O(1)，
+    总高度是 O(1)，按 y 坐标查找项目是一次二分查找。
+    对外的坐标都以当前第一项的顶边为 0。
+    """
+
+    def __init__(self, heights=()):
+        self.rebuild(heights)
+
+    def rebuild(self, heights):
+        """根据高度序列重建索引"""
+        self._ends = []
+        self._head = 0  # 已淘汰的前缀长度（延迟压缩）
+        self._base = 0  # 第一项顶边的绝对坐标
+        for height in heights:
+            self.append(height)
+
+    def append(self, height):
+        last = self._ends[-1] if len(self._ends) > self._head else self._base
+        self._ends.append(last + height)
+
+    def popleft(self):
+        """淘汰第一项"""
+        self._base = self._ends[self._head]
+        self._head += 1
+        # 已淘汰部分超过一半时才真正压缩列表，均摊 O(1)
+        if self._head > 1024 and self._head * 2 > len(self._ends):
+            del self._ends[:self._head]
+            self._head = 0
+
+    def __len__(self):
+        return len(self._ends) - self._head
+
+    @property
+    def origin(self):
+        """第一项顶边的绝对坐标（从头部淘汰项目后增大）"""
+        return self._base
+
+    @property
+    def total(self):
+        """所有项目的总高度"""
+        return self._ends[-1] - self._base if len(self) else 0
+
+    def top(self, index):
+        """第 index 项顶边的 y 坐标（index == len 时为总高度）"""
+        if index <= 0:
+            return 0
+        return self._ends[self._head + index - 1] - self._base
+
+    def bottom(self, index):
+        """第 index 项底边的 y 坐标"""
+        return self._ends[self._head + index] - self._base
+
+    def first_top_at_or_after(self, y):
+        """顶边 >= y 的第一项索引（没有这样的项时为项目数）"""
+        if y <= 0:
+            return 0
+        return min(len(self),
+                   bisect_left(self._ends, y + self._base, self._head) - self._head + 1)
+
+    def count_bottom_at_or_before(self, y):
+        """底边 <= y 的项目数"""
+        return bisect_right(self._ends, y + self._base, self._head) - self._head
+
+
 class DynamicLoader:
     """动态加载器 - 支持滚动和日志记录"""
 
     def __init__(self, screen_width: int, screen_height: int, font,
-                 input_area_height: int = 40, log_file: str = "log.txt"):
+                 input_area_height: int = 40, log_file: str = "log.txt",
+                 image_cache_mb: int = 256, image_workers: int = 0,
+                 pixel_cache_mb: int = 0, pixel_cache_dir: str = "./cache/pixels",
+                 log_format: str = "text", log_max_mb: float = 5):
         """
         初始化动态加载器
 
@@ -139,6 +341,12 @@ class DynamicLoader:
             font: PyGame字体对象
             input_area_height: 输入区域高度
             log_file: 日志文件路径
+            image_cache_mb: 原图缓存的内存上限（MB）
+            image_workers: 后台解码线程数，0 表示在绘制时同步加载
+            pixel_cache_mb: 磁盘像素缓存的上限（MB），0 表示不使用
+            pixel_cache_dir: 磁盘像素缓存目录
+            log_format: 日志格式，"text" 或 "jsonl"
+            log_max_mb: 日志文件轮转的大小上限（MB），0 表示不轮转
         """
         self.screen_width = screen_width
         self.screen_height = screen_height
@@ -148,14 +356,27 @@ class DynamicLoader:
         self.image_registry = {}  # url -> 图片信息
         self.image_surface_cache = {}  # 缓存已渲染的图片Surface
         self.placeholder_color = (100, 100, 150)  # 图片加载前的占位符颜色
+        # 回滚块：已写满的历史记录按固定高度预渲染成块
+        self.use_tiles = True
+        self.TILE_HEIGHT = 512
+        self.TILE_OVERDRAW = 256  # 项目绘制时最多越出自身边界的像素数
+        self.TILE_PAD = 16
+        self.TILE_CACHE_BYTES = 64 * 1024 * 1024  # 预渲染块的内存上限
+        self.tile_cache = SurfaceCache(self.TILE_CACHE_BYTES, "tile")
+        self._tile_floor = 0  # 这之前的块对应的内容都已被淘汰
+        self._placeholder_drawn = False
         # 内容管理
-        self.history: List[ConsoleContent] = []  # 完整的历史记录
-        self.max_history_length = 10000  # 最大历史记录数
+        self._heights = HeightIndex()  # 历史记录的累计高度索引
+        self.max_history_length = 10000  # 最大历史记录数，超出后从最旧的开始淘汰
+        self.history: List[ConsoleContent] = []  # 完整的历史记录（环形缓冲区）
         self.current_display: List[ConsoleContent] = []  # 当前显示的内容
         self.max_visible_items = 10000  # 最大可见项目数
 
         # 滚动控制
-        self.scroll_offset = 0  # 滚动偏移（项目数）
+        self.scroll_px = 0  # 滚动偏移（像素，从底部算起；0 表示显示最新内容）
+        self._view_top = 0  # 可见区域顶边在历史记录中的 y 坐标
+        self._view_end = 0  # 可见项目之后的第一项索引
+        self._appended_from = None  # 上次更新显示后第一条新追加项目的下标（-1 表示发生过淘汰）
         self.line_height = 30  # 每行高度
         self.content_area_height = screen_height - input_area_height - 20  # 内容区域高度
 
@@ -165,50 +386,340 @@ class DynamicLoader:
         self.scrollbar_color = (100, 100, 100)
         self.scrollbar_active_color = (150, 150, 150)
 
+        # 脏区域跟踪：记录哪些区域变化了，由控制台只把这些区域推送到屏幕
+        # 内容区覆盖输入行以上的全部区域（包括滚动条和滚动提示）
+        self.content_rect = pygame.Rect(
+            0, 0, screen_width, screen_height - input_area_height + 10)
+        self.dirty_rects = []
+        self.full_redraw = True  # 首帧整屏绘制
+
         # 日志文件
         self.log_file = log_file
-        self._init_log_file()
+        self.logger = SessionLogger(
+            log_file, log_format, int(log_max_mb * 1024 * 1024))  # 后台批量写入
         # 缓存
-        self.text_surface_cache = {}  # 文本surface缓存
-        self.image_cache = OrderedDict()  # 图片缓存
-        self.CACHE_LIMIT = 50  # 限制内存中最多只保留 50 张最近使用的图片
-        self.clickable_regions = []  # 存储所有可点击区域
+        self.TEXT_CACHE_BYTES = 32 * 1024 * 1024  # 文本surface缓存的内存上限
+        self.text_surface_cache = SurfaceCache(
+            self.TEXT_CACHE_BYTES, "text")  # 文本surface缓存
+        self.wrapper = TextWrapper()  # 换行引擎（按字体缓存字形宽度）
+        self.COMPOSITE_CACHE_BYTES = 64 * 1024 * 1024  # 图片叠加合成结果的内存上限
+        self.composite_cache = SurfaceCache(
+            self.COMPOSITE_CACHE_BYTES, "composite")  # 图片叠加合成缓存
+        self.IMAGE_CACHE_BYTES = image_cache_mb * 1024 * 1024  # 原图缓存的内存上限
+        self.image_cache = SurfaceCache(
+            self.IMAGE_CACHE_BYTES, "image")  # 解码后的原图缓存（按字节数淘汰）
+        self._missing_images = set()  # 已确认不存在或加载失败的图片路径
+        # 磁盘像素缓存：热启动时用内存映射代替 webp 解码
+        self.pixel_cache = PixelCache(
+            pixel_cache_dir, pixel_cache_mb * 1024 * 1024) if pixel_cache_mb > 0 else None
+        # 后台解码：未就绪的图片先画占位符，解码完成后再重绘
+        self.async_loader = AsyncImageLoader(
+            image_workers, self._read_image) if image_workers > 0 else None
+        self.prefetch_screens = 1  # 滚动时预取可见区域上下各几屏内的图片
+        self.VARIANT_CACHE_BYTES = 64 * 1024 * 1024  # 裁剪/缩放结果的内存上限
+        self.variant_cache = SurfaceCache(
+            self.VARIANT_CACHE_BYTES, "variant")  # 裁剪/缩放结果缓存（与原图缓存分开）
         self.clickable_region_counter = 0  # 可点击区域计数器
         self.active_clickable_regions = []  # 当前显示的可点击区域
+        # 可见点击区域的空间索引：按行的 y 坐标排序，只在可见窗口变化时重建
+        self._hit_tops = []  # 每行顶边 y
+        self._hit_rows = []  # (行底边 y, [(rect, click_value), ...])
+        self._hit_index_dirty = True
+
+    @property
+    def history(self):
+        return self._history
+
+    @history.setter
+    def history(self, items):
+        """整体替换历史记录（例如事件临时保存/恢复）时重建高度索引"""
+        items = list(items)[-self.max_history_length:]
+        self._history = HistoryBuffer(items)
+        self._heights.rebuild(item.height for item in items)
+        # 可见范围在下一次 _update_current_display 时重新计算
+        self.current_display = []
+        self._view_top = 0
+        self._view_end = 0
+        self._appended_from = -1  # 整体替换不是追加，下次更新整个内容区
+        self._hit_index_dirty = True
+        # 坐标从 0 重新开始，旧的块全部作废
+        self.invalidate_tiles()
+
+    def _append_history(self, item):
+        """追加一项到历史记录，并同步高度索引；超出上限时淘汰最旧的项目"""
+        self._history.append(item)
+        self._heights.append(item.height)
+        if self._appended_from is None:
+            self._appended_from = len(self._history) - 1
+        while len(self._history) > self.max_history_length:
+            self._release_item(self._history.popleft())
+            self._heights.popleft()
+            self._drop_evicted_tiles()
+            # 下标整体前移，不再按追加处理
+            self._appended_from = -1
+
+    def _drop_evicted_tiles(self):
+        """丢弃内容已全部被淘汰的块"""
+        floor = self._heights.origin // self.TILE_HEIGHT
+        for index in range(self._tile_floor, floor):
+            self.tile_cache.pop(index)
+        self._tile_floor = max(self._tile_floor, floor)
+
+    def _release_item(self, item):
+        """释放被淘汰项目占用的点击区域和缓存"""
+        item.regions = []
+        item.metadata['cached_surface'] = None
+        key = item.metadata.get('composite_key')
+        if key is not None:
+            self.composite_cache.pop(key)
+
+    def _register_region(self, item, click_value, text, region_type, fragment_index=None):
+        """为内容项登记一个可点击区域（区域归该项目所有）"""
+        item.metadata['clickable'] = True
+        region = {
+            'id': self.clickable_region_counter,
+            'click_value': click_value,
+            'text': text,
+            'type': region_type,
+            'fragment_index': fragment_index,
+        }
+        item.regions.append(region)
+        self.clickable_region_counter += 1
+        return region
+
+    def render_text(self, text, color, font=None):
+        """
+        渲染文本并缓存结果，键为 (字体, 文本, 颜色)
+
+        draw() 每帧都会调用，空闲界面上的菜单文本不需要重复光栅化
+        """
+        font = font or self.font
+        key = (font, text, tuple(color))
+        surface = self.text_surface_cache.get(key)
+        if surface is None:
+            surface = font.render(text, True, color)
+            self.text_surface_cache.put(key, surface)
+        return surface
 
     def _get_image_from_cache(self, img_path):
         """
         LRU 缓存获取图片：
-        1. 如果在缓存里，移动到末尾（标记为最近使用），直接返回。
+        1. 如果在缓存里，标记为最近使用，直接返回。
         2. 如果不在缓存里，从硬盘加载。
-        3. 如果缓存满了，删除最久未使用的图片（第一个）。
+        3. 超出内存上限时，从最久未使用的图片开始淘汰。
         """
-        if not img_path or not os.path.exists(img_path):
+        if not img_path:
             return None
 
         # 情况 1: 图片已在缓存中
-        if img_path in self.image_cache:
-            # 将其移动到字典末尾，表示"最近刚刚用过"
-            self.image_cache.move_to_end(img_path)
-            return self.image_cache[img_path]
+        image = self.image_cache.get(img_path)
+        if image is not None:
+            return image
 
-        # 情况 2: 图片不在缓存中，需要加载
-        try:
-            image = pygame.image.load(img_path).convert_alpha()
+        # 不存在的图片只检查一次，之后直接返回
+        if img_path in self._missing_images:
+            return None
+        if not os.path.exists(img_path):
+            self._missing_images.add(img_path)
+            return None
 
-            # 检查缓存是否已满
-            if len(self.image_cache) >= self.CACHE_LIMIT:
-                # [核心逻辑] 弹出第一个元素（即最久没被用过的图片），释放内存
-                removed_path, _ = self.image_cache.popitem(last=False)
-                # print(f"释放图片内存: {removed_path}") # 调试用
+        # 情况 2: 图片不在缓存中，交给后台线程解码，或者同步加载
+        if self.async_loader is not None:
+            self.async_loader.request(img_path)
+            return None
 
-            # 加入缓存
-            self.image_cache[img_path] = image
-            return image
+        try:
+            # 磁盘像素缓存命中时直接使用映射出来的 Surface，不再复制
+            image, mapped = self._read_image(img_path)
+            if not mapped:
+                image = image.convert_alpha()
+            return self.image_cache.put(img_path, image)
 
         except Exception as e:
             print(f"加载图片失败: {img_path} - {e}")
+            self._missing_images.add(img_path)
             return None
+
+    def _read_image(self, img_path):
+        """
+        读取一张图片：磁盘像素缓存有这张整图时直接映射，否则解码（后台解码线程也会调用，这里不做 convert）
+
+        这里不写缓存，只有 get_image_variant 真正绘制用到的像素才写入。
+
+        Returns:
+            (Surface, 是否来自磁盘像素缓存)
+        """
+        if self.pixel_cache is not None:
+            image = self.pixel_cache.load(img_path)
+            if image is not None:
+                return image, True
+
+        return pygame.image.load(img_path), False
+
+    def image_pending(self, img_path):
+        """图片是否正在后台解码"""
+        return self.async_loader is not None and self.async_loader.is_pending(img_path)
+
+    def images_in_flight(self):
+        """是否有图片正在后台解码（等待输入时据此决定是否需要定时收取）"""
+        return self.async_loader is not None and self.async_loader.has_pending()
+
+    def poll_images(self):
+        """
+        收取后台解码完成的图片（主线程调用）
+
+        Returns:
+            是否有新图片就绪（就绪后内容区需要重绘）
+        """
+        if self.async_loader is None:
+            return False
+
+        ready = False
+        for img_path, image, error in self.async_loader.poll():
+            if image is None:
+                print(f"加载图片失败: {img_path} - {error}")
+                self._missing_images.add(img_path)
+            else:
+                self.image_cache.put(img_path, image)
+            ready = True
+
+        if ready:
+            self.mark_dirty()
+        return ready
+
+    def prefetch_images(self, names):
+        """按注册名预取图片文件（例如当前地图上的角色立绘）"""
+        if self.async_loader is None:
+            return
+        for name in names:
+            info = self.image_registry.get(name)
+            if info:
+                self._prefetch_path(info.get('path'))
+
+    def close(self):
+        """退出时停止后台解码线程，并写完剩余日志"""
+        if self.async_loader is not None:
+            self.async_loader.shutdown()
+        self.logger.close()
+
+    def _prefetch_path(self, img_path):
+        if (img_path and img_path not in self.image_cache
+                and img_path not in self._missing_images):
+            self.async_loader.request(img_path)
+
+    def _prefetch_around_display(self):
+        """预取可见区域上下若干屏内的内容项用到的图片"""
+        if self.async_loader is None or not self.current_display:
+            return
+
+        # 可见区域向上下各扩展 margin
+        heights = self._heights
+        margin = self.content_area_height * self.prefetch_screens
+        low = heights.count_bottom_at_or_before(self._view_top - margin)
+        high = heights.first_top_at_or_after(
+            self._view_top + self.content_area_height + margin)
+        for item in self.history[low:high]:
+            for img_path in self._item_image_paths(item):
+                self._prefetch_path(img_path)
+
+    @staticmethod
+    def _item_image_paths(item):
+        """内容项用到的图片文件路径"""
+        if item.type == ContentType.IMAGE_MARK:
+            img_info = item.metadata.get('img_info')
+            if img_info:
+                yield img_info.get('path')
+        elif item.type == ContentType.IMAGE_STACK:
+            for layer in item.metadata.get('layers', []):
+                yield layer.path
+        else:
+            for fragment in item.fragments:
+                if fragment.is_image_mark and fragment.img_info:
+                    yield fragment.image_path()
+
+    def get_image_variant(self, img_path, clip=None, size=None, smooth=False):
+        """
+        获取裁剪/缩放后可直接绘制的图片
+
+        Args:
+            img_path: 图片路径
+            clip: 裁剪区域 (x, y, w, h)，w/h 为 None 时取原图尺寸
+            size: 目标尺寸 (w, h)，为 None 的分量保持裁剪后的尺寸
+            smooth: 是否使用平滑缩放
+
+        Returns:
+            pygame.Surface 或 None（图片加载失败）
+        """
+        key = (img_path, clip, size, smooth)
+        variant = self.variant_cache.get(key)
+        if variant is not None:
+            return variant
+
+        # 裁剪结果先查磁盘像素缓存，命中时连整张原图都不用解码
+        # （原图已在后台解码说明刚查过没有，不再重复查）
+        image = None
+        if clip and self.pixel_cache is not None and not self.image_pending(img_path):
+            image = self.pixel_cache.load(img_path, clip)
+
+        if image is None:
+            source = self._get_image_from_cache(img_path)
+            if not source:
+                return None
+            image = self._crop_image(source, clip)
+            # 只持久化绘制用到的像素：裁剪结果，或者不裁剪时的整张图（已在缓存中的不重复写）
+            if self.pixel_cache is not None:
+                if image is not source:
+                    self.pixel_cache.store(img_path, clip, image)
+                elif not self.pixel_cache.contains(img_path):
+                    self.pixel_cache.store(img_path, None, image)
+
+        # 未裁剪也未缩放时，变体就是对原图的引用
+        return self.variant_cache.put(
+            key, self._scale_image(image, size, smooth))
+
+    @classmethod
+    def _make_variant(cls, image, clip, size, smooth):
+        """按裁剪区域和目标尺寸生成图片变体"""
+        return cls._scale_image(cls._crop_image(image, clip), size, smooth)
+
+    @staticmethod
+    def _crop_image(image, clip):
+        """
+        裁剪图片；不需要裁剪时原样返回
+
+        只要定义的区域跟原图尺寸不一样，或者起始点不在(0,0)，就裁剪
+        """
+        img_w, img_h = image.get_size()
+        if clip:
+            clip_x, clip_y, clip_w, clip_h = clip
+            clip_w = img_w if clip_w is None else clip_w
+            clip_h = img_h if clip_h is None else clip_h
+            needs_crop = (clip_x > 0 or clip_y > 0 or clip_w <
+                          img_w or clip_h < img_h)
+
+            if needs_crop:
+                safe_w = min(clip_w, img_w - clip_x)
+                safe_h = min(clip_h, img_h - clip_y)
+                if safe_w > 0 and safe_h > 0:
+                    # 复制一份，不让缓存的变体引用整张原图
+                    image = image.subsurface(pygame.Rect(
+                        clip_x, clip_y, safe_w, safe_h)).copy()
+        return image
+
+    @staticmethod
+    def _scale_image(image, size, smooth):
+        """缩放到目标尺寸；为 None 的分量保持原尺寸"""
+        if size:
+            target_width, target_height = size
+            if target_width is None:
+                target_width = image.get_width()
+            if target_height is None:
+                target_height = image.get_height()
+            if (target_width, target_height) != image.get_size():
+                scale = pygame.transform.smoothscale if smooth else pygame.transform.scale
+                image = scale(image, (target_width, target_height))
+
+        return image
     # 在DynamicLoader类中添加add_inline_fragments方法
 
     def add_inline_fragments(self, fragments):
@@ -242,23 +753,13 @@ class DynamicLoader:
                 height=self.line_height
             )
 
-            # 注册点击区域
+            # 注册点击区域（标记是第几个片段）
             for i, fragment in enumerate(current_line_fragments):
                 if fragment.click_value:
-                    item.metadata['clickable'] = True
-                    region_id = self.clickable_region_counter
-
-                    self.clickable_regions.append({
-                        'id': region_id,
-                        'content_item': item,
-                        'fragment_index': i,  # 标记是第几个片段
-                        'click_value': fragment.click_value,
-                        'text': fragment.text,
-                        'type': 'inline_fragment'
-                    })
-                    self.clickable_region_counter += 1
+                    self._register_region(
+                        item, fragment.click_value, fragment.text, 'inline_fragment', i)
 
-            self.history.append(item)
+            self._append_history(item)
             added_items.append(item)
 
             # 重置当前行
@@ -293,14 +794,12 @@ class DynamicLoader:
                     current_line_width += frag_width
                 else:
                     # 放不下，需要切分文本
-                    remaining_text = frag.text
-
-                    while remaining_text:
-                        # 尝试找出能在当前行放下的最大子字符串
-                        # 这是一个字符级循环，确保中文也能正确换行
-                        fit_text = ""
-                        fit_width = 0
+                    # 先算出整段的累计字宽，之后每次断行都是一次二分查找
+                    text = frag.text
+                    cum = self.wrapper.prefix_widths(self.font, text)
+                    pos = 0
 
+                    while pos < len(text):
                         # 预计算剩余空间
                         space_left = max_width - current_line_width
 
@@ -309,32 +808,23 @@ class DynamicLoader:
                             commit_line()
                             space_left = max_width
 
-                        # 逐字扫描 (优化：可以先估算，但逐字最准确)
-                        # 为了性能，这里可以优化，但对于VN来说逐字扫描通常够快
-                        split_index = 0
-                        for char in remaining_text:
-                            char_w = self.font.size(char)[0]
-                            if fit_width + char_w <= space_left:
-                                fit_width += char_w
-                                split_index += 1
-                            else:
-                                break
+                        # 找出能在当前行放下的最长前缀（按字符，中文也能正确换行）
+                        split_index = self.wrapper.fit(cum, pos, space_left)
 
                         # 如果是空的（连一个字都放不下），强制换行
-                        if split_index == 0:
+                        if split_index == pos:
                             if current_line_fragments:
                                 commit_line()
                                 continue  # 换行后重试
                             else:
                                 # 极端情况：这一行是空的，但第一个字就比屏幕宽（不太可能发生）
                                 # 强制放入一个字防止死循环
-                                split_index = 1
-                                fit_width = self.font.size(
-                                    remaining_text[0])[0]
+                                split_index = pos + 1
 
                         # 切割文本
-                        fit_text = remaining_text[:split_index]
-                        remaining_text = remaining_text[split_index:]
+                        fit_text = text[pos:split_index]
+                        fit_width = cum[split_index] - cum[pos]
+                        pos = split_index
 
                         # 创建新片段（继承颜色和点击属性）
                         new_frag = InlineFragment(
@@ -350,7 +840,7 @@ class DynamicLoader:
                         current_line_width += fit_width
 
                         # 如果还有剩余文本，说明这行满了，提交换行
-                        if remaining_text:
+                        if pos < len(text):
                             commit_line()
 
         # 提交最后一行
@@ -358,7 +848,7 @@ class DynamicLoader:
 
         # 记录日志
         full_text = ''.join(f.text for f in fragments)
-        self._write_to_log(f"[TEXT] {full_text}")
+        self._write_to_log(f"[TEXT] {full_text}", "inline")
 
         self._update_current_display()
 
@@ -542,7 +1032,7 @@ class DynamicLoader:
                 color=(255, 100, 100),
                 height=self.line_height
             )
-            self.history.append(item)
+            self._append_history(item)
             self._update_current_display()
             return item
 
@@ -578,21 +1068,12 @@ class DynamicLoader:
         )
 
         if click_value:
-            item.metadata['clickable'] = True
-            item.metadata['region_id'] = self.clickable_region_counter
-
-            self.clickable_regions.append({
-                'id': self.clickable_region_counter,
-                'content_item': item,
-                'click_value': click_value,
-                'text': f"[图片] {img_url}",
-                'type': 'image'
-            })
-
-            self.clickable_region_counter += 1
+            region = self._register_region(
+                item, click_value, f"[图片] {img_url}", 'image')
+            item.metadata['region_id'] = region['id']
 
-        self.history.append(item)
-        self._write_to_log(f"[IMAGE] {img_url}")
+        self._append_history(item)
+        self._write_to_log(f"[IMAGE] {img_url}", "image")
         self._update_current_display()
 
         if self.scroll_offset <= 5:
@@ -602,40 +1083,52 @@ class DynamicLoader:
 
     def _add_image_stack_mark(self, img_mark, click_value=None, template_width=None, template_height=None):
         """
-        添加图片叠加标记 - 新格式版本
+        添加图片叠加标记（字符串格式的兼容入口，新代码请直接用 add_image_stack）
         """
-        # 1. 解析新格式的标记字符串
-        img_elements, img_infos = self.parse_image_stack_mark(img_mark)
+        img_elements, _ = self.parse_image_stack_mark(img_mark)
 
         if not img_elements:
             # 解析失败，显示错误文本
             return self.add_text(f"[图片叠加解析失败: {img_mark[:50]}...]", (255, 100, 100))
 
-        # 2. 计算模板尺寸
+        layers = [ImageLayer.from_info(element['name'], element['info'])
+                  for element in img_elements]
+        return self.add_image_stack(layers, click_value, template_width, template_height,
+                                    text=img_mark)
+
+    def add_image_stack(self, layers, click_value=None, template_width=None,
+                        template_height=None, text=None):
+        """
+        添加图片叠加
+
+        Args:
+            layers: ImageLayer 列表，按从下到上的顺序绘制
+            click_value: 点击整个叠加区域时输入的文本
+            template_width/template_height: 模板尺寸，默认为屏幕宽减边距 / 最高图层的高度
+            text: 内容项的文本表示（默认由图层名生成）
+        """
+        layers = list(layers)
+        if not layers:
+            return self.add_text("[图片叠加为空]", (255, 100, 100))
+
+        # 1. 计算模板尺寸
         if template_width is None:
             template_width = self.screen_width - 20  # 默认屏幕宽减边距
 
         if template_height is None:
             # 自动计算高度：取所有图片中的最大高度
-            template_height = 0
-            for element in img_elements:
-                info = element['info']
-                # 优先使用target_height，否则使用original_height
-                height = info.get(
-                    'target_height', info.get('original_height', 270))
-                template_height = max(template_height, height)
-
-        # 3. 计算总高度（模板高度 + 边距）
+            template_height = max(layer.display_height for layer in layers)
+
+        # 2. 计算总高度（模板高度 + 边距）
         total_height = template_height + 10  # 上下各留5px边距
 
-        # 4. 创建ConsoleContent对象
+        # 3. 创建ConsoleContent对象
         item = ConsoleContent(
             ContentType.IMAGE_STACK,
-            img_mark,
+            text or "[IMG_STACK:" + "|".join(layer.name for layer in layers) + "]",
             height=total_height,
             metadata={
-                'img_elements': img_elements,  # 图片元素列表（保持顺序）
-                'img_infos': img_infos,        # 图片信息字典（快速查找）
+                'layers': layers,  # 图层列表（保持顺序）
                 'template_width': template_width,
                 'template_height': template_height,
                 'global_click': click_value,    # 全局点击值（整个叠加区域）
@@ -643,7 +1136,7 @@ class DynamicLoader:
                 'needs_rendering': True,
 
                 # 这些字段在新的渲染器中可能不需要，但保留以兼容旧代码
-                'img_list': [elem['name'] for elem in img_elements],  # 图片名列表
+                'img_list': [layer.name for layer in layers],  # 图片名列表
                 'clip_pos': None,  # 不再使用全局clip_pos，每个图片独立
                 'size': None,      # 不再使用全局size，每个图片独立
                 'chara_id': None,  # 不再使用全局chara_id，每个图片独立
@@ -651,34 +1144,61 @@ class DynamicLoader:
             }
         )
 
-        # 5. 处理点击区域
+        # 4. 处理点击区域
         if click_value:
-            item.metadata['clickable'] = True
-            item.metadata['region_id'] = self.clickable_region_counter
-
-            self.clickable_regions.append({
-                'id': self.clickable_region_counter,
-                'content_item': item,
-                'click_value': click_value,
-                'text': f"[图片叠加] {len(img_elements)}张",
-                'type': 'image_stack'
-            })
+            region = self._register_region(
+                item, click_value, f"[图片叠加] {len(layers)}张", 'image_stack')
+            item.metadata['region_id'] = region['id']
 
-            self.clickable_region_counter += 1
-
-        # 6. 添加到历史记录
-        self.history.append(item)
-        self._write_to_log(f"[IMAGE_STACK] {len(img_elements)}张图片")
+        # 5. 添加到历史记录
+        self._append_history(item)
+        self._write_to_log(f"[IMAGE_STACK] {len(layers)}张图片", "image_stack")
         self._update_current_display()
 
-        # 7. 滚动到底部
+        # 6. 滚动到底部
         if self.scroll_offset <= 5:
             self.scroll_to_bottom()
 
         return item
 
     def set_font(self, font):
+        if font is not self.font:
+            self.wrapper.advances.forget(self.font)
         self.font = font
+        self.invalidate_tiles()
+        self.request_full_redraw()
+
+    def resize(self, screen_width, screen_height):
+        """窗口尺寸变化：更新内容区，丢弃按旧尺寸渲染的块"""
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.content_area_height = screen_height - self.input_area_height - 20
+        self.content_rect = pygame.Rect(
+            0, 0, screen_width, screen_height - self.input_area_height + 10)
+        self.invalidate_tiles()
+        self.request_full_redraw()
+        self._update_current_display()
+
+    def mark_dirty(self, rect=None):
+        """记录需要重绘的区域，默认为整个内容区"""
+        self.dirty_rects.append(
+            pygame.Rect(rect) if rect else self.content_rect.copy())
+
+    def request_full_redraw(self):
+        """滚动、换字体等情况下要求整屏重绘"""
+        self.full_redraw = True
+
+    def consume_dirty(self):
+        """
+        取出并清空脏区域记录
+
+        Returns:
+            (是否需要整屏重绘, 脏矩形列表)
+        """
+        full, rects = self.full_redraw, self.dirty_rects
+        self.full_redraw = False
+        self.dirty_rects = []
+        return full, rects
 
     def handle_mouse_click(self, mouse_pos: Tuple[int, int]) -> Optional[str]:
         """
@@ -690,121 +1210,115 @@ class DynamicLoader:
         Returns:
             点击的文本值，如果没有点击可点击区域则返回None
         """
-        # 更新活动点击区域
-        # self._update_active_clickable_regions()
+        self._ensure_hit_index()
+
+        # 先二分找到点击位置所在的行，再检查这一行里的几个区域
+        x, y = mouse_pos
+        row = bisect_right(self._hit_tops, y) - 1
+        if row < 0 or y >= self._hit_rows[row][0]:
+            return None
 
-        # 检查是否点击了任何活动区域
-        for region in self.active_clickable_regions:
-            if region['rect'].collidepoint(mouse_pos):
-                return region['click_value']
+        for rect, click_value in self._hit_rows[row][1]:
+            if rect.collidepoint(mouse_pos):
+                return click_value
 
         return None
 
-    def _update_active_clickable_regions(self):
-        """更新当前显示的可点击区域"""
+    def _ensure_hit_index(self):
+        """可见窗口变化后重建点击区域索引"""
+        if self._hit_index_dirty:
+            self._rebuild_hit_index()
+            self._hit_index_dirty = False
+
+    @property
+    def viewport_rect(self):
+        """内容区在屏幕上的矩形"""
+        return pygame.Rect(0, 10, self.screen_width, self.content_area_height)
+
+    def _first_item_y(self):
+        """当前显示的第一项在屏幕上的 y 坐标"""
+        if not self.current_display:
+            return 10
+        first = self._view_end - len(self.current_display)
+        return 10 + self._heights.top(first) - self._view_top
+
+    def _rebuild_hit_index(self):
+        """按当前显示内容的布局计算可点击区域，按 y 排序存入索引"""
+        self._hit_tops = []
+        self._hit_rows = []
         self.active_clickable_regions = []
-        current_y = 10
+        viewport = self.viewport_rect
+        current_y = self._first_item_y()
 
-        # 遍历当前显示的内容项
         for item in self.current_display:
-            # 检查普通文本点击区域
-            if 'clickable' in item.metadata and item.metadata['clickable']:
-                # 根据项目类型计算区域
-                region_rect = None
-
-                if item.type == ContentType.TEXT:
-                    # 文本区域
-                    text_width = self.font.size(
-                        item.data)[0] if item.data else 0
-                    region_rect = pygame.Rect(
-                        10, current_y, text_width, item.height)
-
-                elif item.type == ContentType.IMAGE:
-                    # 图片区域
-                    if item.data in self.image_cache:
-                        image = self.image_cache[item.data]
-                        img_x = 10  # 图片从左侧开始
-                        region_rect = pygame.Rect(
-                            img_x, current_y, image.get_width(), item.height)
-
-                if region_rect:
-                    # 查找对应的点击区域记录
-                    for region in self.clickable_regions:
-                        if region.get('content_item') == item and region.get('type') in ['text', 'image']:
-                            region['rect'] = region_rect
-                            self.active_clickable_regions.append({
-                                'id': region['id'],
-                                'rect': region_rect,
-                                'click_value': region['click_value'],
-                                'text': region['text'],
-                                'type': region['type']
-                            })
-
-            # 检查行内片段点击区域
-            elif item.fragments:
-                current_x = 10
+            if item.regions:
+                hits = []
+                for region, rect in self._item_region_rects(item, 10, current_y):
+                    # 只露出一部分的项目，只有露出的部分可以点击
+                    rect = rect.clip(viewport)
+                    if not rect.width or not rect.height:
+                        continue
+                    hits.append((rect, region['click_value']))
+                    self.active_clickable_regions.append({
+                        'id': region['id'],
+                        'rect': rect,
+                        'click_value': region['click_value'],
+                        'text': region.get('text', ''),
+                        'type': region.get('type')
+                    })
+                if hits:
+                    self._hit_tops.append(max(current_y, viewport.top))
+                    self._hit_rows.append(
+                        (min(current_y + item.height, viewport.bottom), hits))
 
-                for i, fragment in enumerate(item.fragments):
-                    # 计算片段宽度
-                    fragment.calculate_width(self.font)
-
-                    # 检查是否需要换行
-                    available_width = self.screen_width - current_x - 20
-                    if fragment.width > available_width and current_x > 10:
-                        current_x = 10
-                        current_y += item.height
-
-                    # 如果是可点击片段
-                    if fragment.click_value:
-                        region_rect = pygame.Rect(
-                            current_x, current_y, fragment.width, item.height)
-
-                        # 查找对应的点击区域记录
-                        for region in self.clickable_regions:
-                            if (region.get('content_item') == item and
-                                region.get('fragment_index') == i and
-                                    region.get('type') == 'inline_fragment'):
-                                region['rect'] = region_rect
-                                self.active_clickable_regions.append({
-                                    'id': region['id'],
-                                    'rect': region_rect,
-                                    'click_value': region['click_value'],
-                                    'text': region['text'],
-                                    'type': region['type']
-                                })
-
-                    current_x += fragment.width
-
-                # 一行绘制完毕，换行
-                if item.fragments:
-                    current_y += item.height
+            current_y += item.height
+
+    def _item_region_rects(self, item, x, y):
+        """计算内容项在 (x, y) 处绘制时，各个点击区域的屏幕矩形"""
+        metadata = item.metadata
+
+        if item.type == ContentType.IMAGE_STACK:
+            template_width = metadata.get('template_width', self.screen_width - 20)
+            template_height = metadata.get('template_height', 300)
+            rect = pygame.Rect(x, y, template_width, template_height)
+            return [(region, rect) for region in item.regions]
+
+        if item.type == ContentType.IMAGE_MARK:
+            size = metadata.get('size')
+            img_info = metadata.get('img_info') or {}
+            width = size[0] if size else img_info.get('original_width', 270)
+            rect = pygame.Rect(x, y, width, item.height - 10)
+            return [(region, rect) for region in item.regions]
+
+        # 行内片段：按片段宽度累加得到各片段的横向位置
+        positions = []
+        current_x = x
+        for fragment in item.fragments:
+            if fragment.width == 0:
+                fragment.calculate_width(self.font)
+            positions.append((current_x, fragment.width))
+            current_x += fragment.width
+
+        rects = []
+        for region in item.regions:
+            index = region.get('fragment_index')
+            if index is None:
+                rect = pygame.Rect(x, y, current_x - x, item.height)
+            elif index < len(positions):
+                frag_x, frag_width = positions[index]
+                rect = pygame.Rect(frag_x, y, frag_width, item.height)
             else:
-                # 更新Y位置
-                current_y += item.height
+                continue
+            rects.append((region, rect))
+        return rects
 
     def clear_clickable_regions(self):
         """清空所有可点击区域"""
-        self.clickable_regions = []
+        for item in self.history:
+            item.regions = []
         self.active_clickable_regions = []
         self.clickable_region_counter = 0
-
-        # 清空历史记录中所有内容的点击元数据
-
-    def _init_log_file(self):
-        """初始化日志文件"""
-        try:
-            # 创建日志文件目录（如果不存在）
-            log_dir = os.path.dirname(self.log_file)
-            if log_dir and not os.path.exists(log_dir):
-                os.makedirs(log_dir)
-
-            # 写入初始信息
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                f.write(f"\n{'='*60}\n")
-                f.write(f"会话开始时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"{'='*60}\n\n")
-        except Exception as e:
-            print(f"初始化日志文件失败: {e}")
+        self._hit_index_dirty = True
 
     def add_text(self, text: str, color: Tuple[int, int, int] = (255, 255, 255)) -> List[ConsoleContent]:
         """
@@ -823,7 +1337,7 @@ class DynamicLoader:
         if text is None or text == "":
             item = ConsoleContent(ContentType.TEXT, "",
                                   color, self.line_height)
-            self.history.append(item)
+            self._append_history(item)
             self._write_to_log("")
             added_items.append(item)
             self._update_current_display()
@@ -837,49 +1351,25 @@ class DynamicLoader:
         # 处理制表符
         text = text.replace('\t', '    ')
 
-        # 分割文本为多行
+        # 分割文本为多行（超出屏幕宽度减去滚动条和边距时自动换行）
+        max_width = self.screen_width - 40 - \
+            (self.scrollbar_width if self.scrollbar_visible else 0)
         lines = []
-        current_line = ""
-
-        for char in text:
-            # 处理换行符
-            if char == '\n':
-                if current_line:
-                    lines.append(current_line)
-                    current_line = ""
-                lines.append("")  # 空行
-                continue
 
-            # 测试添加当前字符后的宽度
-            test_line = current_line + char
-            text_width = self.font.size(test_line)[0]
-
-            # 如果超出屏幕宽度（减去滚动条和边距）
-            max_width = self.screen_width - 40 - \
-                (self.scrollbar_width if self.scrollbar_visible else 0)
-            if text_width > max_width:
-                if current_line:
-                    lines.append(current_line)
-                current_line = char
-            else:
-                current_line = test_line
-
-        # 添加最后一行
-        if current_line:
-            lines.append(current_line)
+        for i, part in enumerate(text.split('\n')):
+            # 每个换行符产生一个空行
+            if i > 0:
+                lines.append("")
+            lines.extend(self.wrapper.wrap(self.font, part, max_width))
 
         # 将新行添加到历史记录
         for line in lines:
             item = ConsoleContent(ContentType.TEXT, line,
                                   color, self.line_height)
-            self.history.append(item)
+            self._append_history(item)
             self._write_to_log(line)
             added_items.append(item)
 
-        # 限制历史记录长度
-        if len(self.history) > self.max_history_length:
-            self.history = self.history[-self.max_history_length:]
-
         # 更新当前显示
         self._update_current_display()
 
@@ -901,8 +1391,8 @@ class DynamicLoader:
         divider_text = char * length
         item = ConsoleContent(ContentType.DIVIDER,
                               divider_text, color, self.line_height)
-        self.history.append(item)
-        self._write_to_log(divider_text)
+        self._append_history(item)
+        self._write_to_log(divider_text, "divider")
         self._update_current_display()
         return item
 
@@ -918,96 +1408,139 @@ class DynamicLoader:
         for item in items:
             content_item = ConsoleContent(
                 ContentType.MENU, item, color, self.line_height)
-            self.history.append(content_item)
-            self._write_to_log(item)
+            self._append_history(content_item)
+            self._write_to_log(item, "menu")
             added_items.append(content_item)
 
         self._update_current_display()
         return added_items
 
-    def _write_to_log(self, text: str):
-        """写入日志文件"""
-        try:
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                timestamp = time.strftime("[%H:%M:%S] ")
-                f.write(timestamp + text + "\n")
-        except Exception as e:
-            print(f"写入日志失败: {e}")
+    def _write_to_log(self, text: str, kind: str = "text"):
+        """写入日志（交给后台线程批量写盘）"""
+        self.logger.write(text, kind)
+
+    def flush_log(self):
+        """请求尽快把日志写盘（例如开始等待输入时）"""
+        self.logger.flush()
+
+    def _update_current_display(self, mark_dirty=True):
+        """
+        更新当前显示的内容（根据像素滚动偏移，两次二分查找出可见窗口）
+
+        Args:
+            mark_dirty: 可见窗口没有因追加而局部变化时，是否把整个内容区标脏
+        """
+        old_view_top = self._view_top
+        appended_from, self._appended_from = self._appended_from, None
 
-    def _update_current_display(self):
-        """更新当前显示的内容（根据滚动偏移）"""
         # 清空当前显示
         self.current_display = []
+        self._view_top = 0
+        self._view_end = 0
 
         # 如果历史记录为空，直接返回
         if not self.history:
             return
 
-        # 计算起始索引
-        # scroll_offset 表示跳过的最新项目数
-        start_index = max(0, len(self.history) - 1 - self.scroll_offset)
-
-        # 从起始索引开始向前（向历史方向）显示
+        heights = self._heights
         available_height = self.content_area_height
-        current_height = 0
 
-        for i in range(start_index, -1, -1):
-            item = self.history[i]
-            if current_height + item.height <= available_height:
-                self.current_display.insert(0, item)  # 保持顺序
-                current_height += item.height
-            else:
-                break
-
-        # 如果显示区域还有空间，尝试向后（向最新方向）显示
-        # 这样可以确保显示区域总是填满
-        if current_height < available_height and start_index < len(self.history) - 1:
-            for i in range(start_index + 1, len(self.history)):
-                item = self.history[i]
-                if current_height + item.height <= available_height:
-                    self.current_display.append(item)  # 添加到末尾
-                    current_height += item.height
-                else:
-                    break
+        # 内容变少（例如整体替换历史记录）后，滚动偏移不能超过最大值
+        self.scroll_px = min(self.scroll_px, self.max_scroll_px)
+
+        # 可见区域 [view_top, view_top + 可用高度)，内容不足一屏时从顶部开始显示
+        view_top = max(0, heights.total - available_height - self.scroll_px)
+        view_bottom = view_top + available_height
+
+        # 第一项：底边在 view_top 之后；最后一项：顶边在 view_bottom 之前
+        begin = heights.count_bottom_at_or_before(view_top)
+        end = heights.first_top_at_or_after(view_bottom)
+        self.current_display = self.history[begin:end]
+        self._view_top = view_top
+        self._view_end = end
 
         # 更新滚动条可见性
-        total_height = sum(item.height for item in self.history)
-        self.scrollbar_visible = total_height > self.content_area_height
+        self.scrollbar_visible = heights.total > self.content_area_height
+
+        # 可见内容变了，内容区需要重绘，点击区域需要重新定位
+        if (appended_from is not None and appended_from >= 0
+                and view_top == old_view_top and not self.scrollbar_visible):
+            # 内容不满一屏时在末尾追加不会移动已有内容，只重绘新项目所在的区域
+            # （上下各留出项目可能越界绘制的高度）
+            top = 10 + heights.top(appended_from) - view_top - self.TILE_OVERDRAW
+            bottom = 10 + heights.total - view_top + self.TILE_OVERDRAW
+            self.mark_dirty(pygame.Rect(
+                0, top, self.content_rect.width, bottom - top).clip(self.content_rect))
+        elif mark_dirty:
+            self.mark_dirty()
+        self._hit_index_dirty = True
+
+    @property
+    def max_scroll_px(self):
+        """最大滚动偏移（像素）"""
+        return max(0, self._heights.total - self.content_area_height)
+
+    @property
+    def scroll_offset(self):
+        """
+        滚动偏移（项目数）：可见区域之后还有多少条更新的内容
+
+        保留给按条目计算的旧代码使用，实际滚动位置由 scroll_px 决定
+        """
+        return len(self.history) - self._view_end if self.current_display else 0
+
+    @scroll_offset.setter
+    def scroll_offset(self, offset):
+        """按条目设置滚动位置：让倒数第 offset+1 项的底边贴住可见区域底部"""
+        if not self.history:
+            self._set_scroll_px(0)
+            return
+        index = max(0, len(self.history) - 1 - offset)
+        self._set_scroll_px(self._heights.total - self._heights.bottom(index))
 
     def scroll_up(self, amount: int = 1):
-        """向上滚动（查看更旧的内容）"""
-        # 最大滚动偏移是历史记录总数减1
-        max_scroll = max(0, len(self.history) - 1)
-        self.scroll_offset = min(max_scroll, self.scroll_offset + amount)
-        self._update_current_display()
+        """向上滚动（查看更旧的内容），amount 以行高为单位"""
+        self.scroll_by_pixels(amount * self.line_height)
 
     def scroll_down(self, amount: int = 1):
-        """向下滚动（查看更新的内容）"""
-        self.scroll_offset = max(0, self.scroll_offset - amount)
-        self._update_current_display()
+        """向下滚动（查看更新的内容），amount 以行高为单位"""
+        self.scroll_by_pixels(-amount * self.line_height)
+
+    def scroll_by_pixels(self, dy):
+        """按像素滚动，dy 为正向上（更旧），为负向下（更新）"""
+        self._set_scroll_px(self.scroll_px + dy)
 
     def scroll_to_bottom(self):
         """滚动到底部 - 显示最新的内容"""
-        self.scroll_offset = 0
-        self._update_current_display()
+        self._set_scroll_px(0)
 
     def scroll_to_top(self):
         """滚动到顶部 - 显示最旧的内容"""
-        # 设置滚动偏移为最大值
-        self.scroll_offset = max(0, len(self.history) - 1)
-        self._update_current_display()
+        self._set_scroll_px(self.max_scroll_px)
+
+    def _set_scroll_px(self, px):
+        """设置像素滚动偏移；真正发生滚动时整屏重绘"""
+        px = max(0, min(int(px), self.max_scroll_px))
+        changed = px != self.scroll_px
+        if changed:
+            self.request_full_redraw()
+        self.scroll_px = px
+        # 没有真正滚动时可见内容不变（内容变化已在追加时标记过）
+        self._update_current_display(mark_dirty=changed)
+        if changed:
+            self._prefetch_around_display()
 
     def clear_history(self):
         """清空历史记录"""
         self.history = []
         self.current_display = []
-        self.scroll_offset = 0
-        self.image_cache = OrderedDict()
-        self.clickable_regions = []
+        self.scroll_px = 0
         self.active_clickable_regions = []
         self.clickable_region_counter = 0
+        self._hit_index_dirty = True
+        self.request_full_redraw()
         # 在日志中记录清空操作
-        self._write_to_log("[系统] 历史记录已清空")
+        self._write_to_log("[系统] 历史记录已清空", "system")
 
     # dynamic_loader.py - 添加 _render_and_draw_image_stack 方法
 
@@ -1018,97 +1551,187 @@ class DynamicLoader:
         # 获取参数
         template_width = metadata.get('template_width', self.screen_width - 20)
         template_height = metadata.get('template_height', 300)
-        img_elements = metadata.get('img_elements', [])
+        layers = metadata.get('layers', [])
 
-        if not img_elements:
+        if not layers:
             self._draw_image_error(screen, x, y, template_height)
             return None
 
         try:
-            # 创建透明画布 (每帧实时创建，开销很小，Python GC 会自动回收)
-            final_surface = pygame.Surface(
-                (template_width, template_height), pygame.SRCALPHA)
-
-            for element in img_elements:
-                info = element['info']
-                img_path = info.get('path')
-
-                # 1. [LRU] 从缓存获取原始图片 (不要修改这个对象!)
-                image = self._get_image_from_cache(img_path)
-                if not image:
-                    continue
-
-                # 2. [裁剪] 获取参数并判断是否需要裁剪
-                csv_x = info.get('clip_x', 0)
-                csv_y = info.get('clip_y', 0)
-                csv_w = info.get('original_width', image.get_width())
-                csv_h = info.get('original_height', image.get_height())
-                img_w, img_h = image.get_size()
-
-                # 判断逻辑：只要定义的区域跟原图尺寸不一样，或者起始点不在(0,0)，就裁剪
-                needs_crop = (csv_x > 0 or csv_y > 0 or csv_w <
-                              img_w or csv_h < img_h)
-
-                if needs_crop:
-                    safe_w = min(csv_w, img_w - csv_x)
-                    safe_h = min(csv_h, img_h - csv_y)
-
-                    if safe_w > 0 and safe_h > 0:
-                        # subsurface 是共享内存引用，速度极快
-                        image = image.subsurface(
-                            pygame.Rect(csv_x, csv_y, safe_w, safe_h))
-
-                # 3. [缩放]
-                target_width = info.get('target_width', image.get_width())
-                target_height = info.get('target_height', image.get_height())
-
-                if target_width != image.get_width() or target_height != image.get_height():
-                    image = pygame.transform.scale(
-                        image, (target_width, target_height))
-
-                # 4. [偏移并绘制]
-                offset_x = info.get('offset_x', 0)
-                offset_y = info.get('offset_y', 0)
-                final_surface.blit(image, (offset_x, offset_y))
-
-            # 绘制最终结果到屏幕
-            screen.blit(final_surface, (x, y))
-
-            # 5. [点击区域] 更新并加入活跃列表
-            if metadata.get('clickable'):
-                rect = pygame.Rect(x, y, template_width, template_height)
-
-                for region in self.clickable_regions:
-                    if region.get('content_item') == item:
-                        # 更新永久记录
-                        region['rect'] = rect
-                        # 加入当前帧活跃列表
-                        self.active_clickable_regions.append({
-                            'id': region['id'],
-                            'rect': rect,
-                            'click_value': region['click_value'],
-                            'text': region.get('text', ''),
-                            'type': region.get('type', 'image_stack')
-                        })
-
-            return final_surface
+            # 合成结果按图层参数缓存，之后每帧只需一次 blit
+            key = metadata.get('composite_key')
+            if key is None:
+                key = self._composite_key(
+                    layers, template_width, template_height)
+                metadata['composite_key'] = key
+
+            cached = self.composite_cache.get(key)
+            if cached is None:
+                cached = self._compose_image_stack(
+                    layers, template_width, template_height)
+                # 有图层还在后台解码时先画占位符，不缓存半成品
+                if any(self.image_pending(layer.path) for layer in layers):
+                    self._draw_image_placeholder(
+                        screen, x, y, template_width, template_height)
+                    return None
+                surface, _ = cached
+                if surface is not None:
+                    self.composite_cache.put(
+                        key, cached, surface_bytes(surface))
+                metadata['needs_rendering'] = False
+
+            surface, (offset_x, offset_y) = cached
+            if surface is not None:
+                # 绘制最终结果到屏幕（点击区域由点击索引负责）
+                screen.blit(surface, (x + offset_x, y + offset_y))
+
+            return surface
 
         except Exception as e:
             print(f"渲染图片叠加失败: {e}")
             self._draw_image_error(screen, x, y, template_height)
             return None
+
+    @staticmethod
+    def _composite_key(layers, template_width, template_height):
+        """图片叠加的缓存键：模板尺寸 + 每个图层的路径、裁剪、缩放和偏移"""
+        return (template_width, template_height,
+                tuple(layer.cache_key() for layer in layers))
+
+    def _compose_image_stack(self, layers, template_width, template_height):
+        """
+        把各图层合成为一张透明图
+
+        画布只取图层在模板内的包围盒，而不是整个模板宽度。
+
+        Returns:
+            (surface, (包围盒左上角 x, y))，没有可见图层时 surface 为 None
+        """
+        images = []
+        for layer in layers:
+            # 裁剪/缩放结果来自变体缓存
+            image = self.get_image_variant(layer.path, clip=layer.clip, size=layer.size)
+            if image:
+                images.append((image, layer.offset))
+
+        # 计算图层在模板范围内的包围盒
+        template_rect = pygame.Rect(0, 0, template_width, template_height)
+        bounds = None
+        for image, offset in images:
+            rect = image.get_rect(topleft=offset).clip(template_rect)
+            if rect.width and rect.height:
+                bounds = rect if bounds is None else bounds.union(rect)
+
+        if bounds is None:
+            return None, (0, 0)
+
+        final_surface = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        for image, (offset_x, offset_y) in images:
+            final_surface.blit(image, (offset_x - bounds.x, offset_y - bounds.y))
+        return final_surface, bounds.topleft
+
     # dynamic_loader.py - 修改 draw 方法
 
     def draw(self, screen: pygame.Surface):
         """绘制内容到屏幕 - 增强版，支持图片标记和图片叠加渲染"""
-        self._update_active_clickable_regions()
-        current_y = 10
+        # 第一项可能只露出下半部分，起点在内容区顶边之上；裁剪掉内容区之外的部分
+        previous_clip = screen.get_clip()
+        screen.set_clip(previous_clip.clip(self.viewport_rect))
 
-        # 绘制可见内容
-        for item in self.current_display:
-            if current_y + item.height > self.content_area_height + 10:
-                break
+        if self.use_tiles:
+            self._draw_tiled(screen)
+        else:
+            self._draw_items(screen, self.current_display, self._first_item_y())
 
+        screen.set_clip(previous_clip)
+
+        # 绘制滚动条（如果需要）
+        if self.scrollbar_visible and len(self.history) > 0:
+            self._draw_scrollbar(screen)
+
+    def _draw_tiled(self, screen):
+        """
+        用预渲染的块绘制可见区域
+
+        历史记录按绝对 y 坐标切成固定高度的块，已经写满的块渲染一次后缓存，
+        滚动和空闲帧只需 blit 几个块；最后一个还没写满的块照常逐项绘制。
+        """
+        heights = self._heights
+        tile_height = self.TILE_HEIGHT
+        overdraw = self.TILE_OVERDRAW
+        origin = heights.origin
+        view_top = origin + self._view_top
+        view_bottom = view_top + self.content_area_height
+        # 这个坐标之前的块都已写满（后面追加的内容也不会再越界画进来），内容不会再变
+        complete_end = (origin + heights.total - overdraw) // tile_height * tile_height
+
+        index = view_top // tile_height
+        while index * tile_height < min(view_bottom, complete_end):
+            screen.blit(self._get_tile(index),
+                        (0, 10 + index * tile_height - view_top))
+            index += 1
+
+        if view_bottom <= complete_end or not self.current_display:
+            return
+
+        # 未写满的部分逐项绘制，裁剪掉已由块画出的部分
+        tail_y = 10 + max(0, complete_end - view_top)
+        clip = screen.get_clip()
+        screen.set_clip(clip.clip(
+            pygame.Rect(0, tail_y, self.screen_width, clip.bottom - tail_y)))
+        begin, end = self._items_overlapping(
+            max(complete_end, view_top) - origin, view_bottom - origin)
+        self._draw_items(screen, self.history[begin:end],
+                         10 + heights.top(begin) - self._view_top)
+        screen.set_clip(clip)
+
+    def _items_overlapping(self, top, bottom):
+        """
+        可能画进 [top, bottom) 的项目范围
+
+        行内图片按原尺寸居中绘制，可能超出所在行的上下边界，所以两端各多取 TILE_OVERDRAW 像素。
+        """
+        heights = self._heights
+        begin = heights.count_bottom_at_or_before(top - self.TILE_OVERDRAW)
+        end = heights.first_top_at_or_after(bottom + self.TILE_OVERDRAW)
+        return begin, end
+
+    def _get_tile(self, index):
+        """取第 index 块，不在缓存中时渲染"""
+        tile = self.tile_cache.get(index)
+        if tile is None:
+            tile = self._render_tile(index)
+        return tile
+
+    def _render_tile(self, index):
+        """把绝对 y 坐标 [index*块高, (index+1)*块高) 内的内容画到一张块上"""
+        heights = self._heights
+        tile_height = self.TILE_HEIGHT
+        top = index * tile_height - heights.origin
+        begin, end = self._items_overlapping(top, top + tile_height)
+
+        # 先画到上下各多出几行的画布上再截取：pygame.draw.rect 的边框被画布边缘截断时
+        # 会画在边缘那一行上，直接画在块上会在块的接缝处留下多余的线
+        pad = self.TILE_PAD
+        canvas = pygame.Surface((self.screen_width, tile_height + 2 * pad))
+        canvas.fill((0, 0, 0))
+        self._placeholder_drawn = False
+        self._draw_items(canvas, self.history[begin:end], heights.top(begin) - top + pad)
+        tile = canvas.subsurface((0, pad, self.screen_width, tile_height)).copy()
+
+        # 有图片还在后台解码的块先不缓存，下一帧重新渲染
+        if not self._placeholder_drawn:
+            self.tile_cache.put(index, tile)
+        return tile
+
+    def invalidate_tiles(self):
+        """丢弃所有预渲染的块（换字体、改变尺寸、历史记录整体替换时）"""
+        self.tile_cache.clear()
+        self._tile_floor = 0
+
+    def _draw_items(self, screen, items, current_y):
+        """从 current_y 开始依次绘制内容项"""
+        for item in items:
             if item.type == ContentType.TEXT:
                 current_x = 10
 
@@ -1125,25 +1748,17 @@ class DynamicLoader:
                         # 如果是图片标记
                         if fragment.is_image_mark:
                             # 渲染图片
-                            image = fragment.render_image()
+                            image = fragment.render_image(self)
                             if image:
                                 # 计算图片位置（垂直居中于行高）
                                 img_y = current_y + \
                                     (max_height_in_line - image.get_height()) // 2
                                 screen.blit(image, (current_x, img_y))
-
-                                # 加入点击区域 (Active)
-                                if fragment.click_value:
-                                    region_rect = pygame.Rect(
-                                        current_x, img_y, image.get_width(), image.get_height())
-                                    # ... 添加到 active_clickable_regions ...
-                                    # (请确保这里复制了之前修复点击的代码)
-                                    self.active_clickable_regions.append({
-                                        # ... 你的 active 列表添加逻辑 ...
-                                        'id': -1,  # id 此时不重要，重要的是 rect 和 value
-                                        'rect': region_rect,
-                                        'click_value': fragment.click_value
-                                    })
+                            elif self.image_pending(fragment.image_path()):
+                                # 图片还在后台解码
+                                self._draw_image_placeholder(
+                                    screen, current_x, current_y,
+                                    fragment.width, max_height_in_line)
                             else:
                                 # 图片加载失败，绘制占位符
                                 placeholder_rect = pygame.Rect(current_x, current_y,
@@ -1155,8 +1770,8 @@ class DynamicLoader:
                                     screen, (150, 150, 150), placeholder_rect, 1)
 
                                 # 绘制加载失败文本
-                                error_text = self.font.render(
-                                    "X", True, (255, 100, 100))
+                                error_text = self.render_text(
+                                    "X", (255, 100, 100))
                                 screen.blit(
                                     error_text, (current_x + 5, current_y + 5))
 
@@ -1164,30 +1779,13 @@ class DynamicLoader:
 
                         else:
                             # 普通文本
-                            text_surface = self.font.render(
-                                fragment.text, True, fragment.color)
+                            text_surface = self.render_text(
+                                fragment.text, fragment.color)
 
                             # 计算文本基线位置（与图片垂直居中）
                             text_y = current_y + \
                                 (max_height_in_line - text_surface.get_height()) // 2
                             screen.blit(text_surface, (current_x, text_y))
-
-                            # 如果有点击功能，添加点击区域
-                            if fragment.click_value:
-                                region_id = self.clickable_region_counter
-                                self.clickable_region_counter += 1
-
-                                region_rect = pygame.Rect(current_x, text_y,
-                                                          text_surface.get_width(),
-                                                          text_surface.get_height())
-
-                                self.active_clickable_regions.append({
-                                    'id': region_id,
-                                    'rect': region_rect,
-                                    'click_value': fragment.click_value,
-                                    'type': 'text'
-                                })
-
                             current_x += fragment.width
 
                     # 一行绘制完毕，换行
@@ -1195,8 +1793,7 @@ class DynamicLoader:
 
                 else:
                     # 普通文本（没有片段）
-                    text_surface = self.font.render(
-                        item.data, True, item.color)
+                    text_surface = self.render_text(item.data, item.color)
                     screen.blit(text_surface, (10, current_y))
                     current_y += item.height
 
@@ -1212,15 +1809,15 @@ class DynamicLoader:
 
             elif item.type == ContentType.IMAGE:
                 # 处理旧的图片类型（向后兼容）
-                if item.data in self.image_cache:
-                    image = self.image_cache[item.data]
+                image = self.image_cache.get(item.data)
+                if image is not None:
                     screen.blit(image, (10, current_y))
 
                 current_y += item.height
 
             elif item.type == ContentType.DIVIDER:
                 # 绘制分割线
-                text_surface = self.font.render(item.data, True, item.color)
+                text_surface = self.render_text(item.data, item.color)
                 text_width = text_surface.get_width()
                 x_pos = (self.screen_width - text_width) // 2
                 screen.blit(text_surface, (x_pos, current_y))
@@ -1228,14 +1825,10 @@ class DynamicLoader:
 
             elif item.type == ContentType.MENU:
                 # 绘制菜单项
-                text_surface = self.font.render(item.data, True, item.color)
+                text_surface = self.render_text(item.data, item.color)
                 screen.blit(text_surface, (20, current_y))
                 current_y += item.height
 
-        # 绘制滚动条（如果需要）
-        if self.scrollbar_visible and len(self.history) > 0:
-            self._draw_scrollbar(screen)
-
     def _render_and_draw_image_mark(self, screen, item, x, y):
         """渲染并绘制单张图片标记 - 最终优化版"""
         metadata = item.metadata
@@ -1247,13 +1840,6 @@ class DynamicLoader:
             return None
 
         try:
-            # 1. [LRU] 获取图片
-            image = self._get_image_from_cache(img_info.get('path'))
-            if not image:
-                self._draw_image_error(screen, x, y, item.height - 10)
-                return None
-
-            # 2. [裁剪]
             # 优先使用 PRINTIMG 传入的 clip 参数，其次使用 CSV 默认值
             param_clip = metadata.get('clip_pos')
             if param_clip:
@@ -1263,45 +1849,24 @@ class DynamicLoader:
                 clip_y = img_info.get('clip_y', 0)
 
             # 宽度/高度通常由 CSV 定义
-            clip_w = img_info.get('original_width', image.get_width())
-            clip_h = img_info.get('original_height', image.get_height())
-
-            img_w, img_h = image.get_size()
-            needs_crop = (clip_x > 0 or clip_y > 0 or clip_w <
-                          img_w or clip_h < img_h)
-
-            if needs_crop:
-                safe_w = min(clip_w, img_w - clip_x)
-                safe_h = min(clip_h, img_h - clip_y)
-                if safe_w > 0 and safe_h > 0:
-                    image = image.subsurface(pygame.Rect(
-                        clip_x, clip_y, safe_w, safe_h))
-
-            # 3. [缩放]
             size = metadata.get('size')
-            if size:
-                target_width, target_height = size
-                image = pygame.transform.scale(
-                    image, (target_width, target_height))
+            image = self.get_image_variant(
+                img_info.get('path'),
+                clip=(clip_x, clip_y,
+                      img_info.get('original_width'), img_info.get('original_height')),
+                size=tuple(size) if size else None)
+            if not image:
+                if self.image_pending(img_info.get('path')):
+                    width = size[0] if size else img_info.get('original_width', 270)
+                    self._draw_image_placeholder(
+                        screen, x, y, width, item.height - 10)
+                else:
+                    self._draw_image_error(screen, x, y, item.height - 10)
+                return None
 
-            # 绘制
+            # 绘制（点击区域由点击索引负责）
             screen.blit(image, (x, y))
 
-            # 4. [点击区域]
-            if metadata.get('clickable'):
-                rect = pygame.Rect(x, y, image.get_width(), image.get_height())
-
-                for region in self.clickable_regions:
-                    if region.get('content_item') == item:
-                        region['rect'] = rect
-                        self.active_clickable_regions.append({
-                            'id': region['id'],
-                            'rect': rect,
-                            'click_value': region['click_value'],
-                            'text': region.get('text', ''),
-                            'type': region.get('type', 'image')
-                        })
-
             return image
 
         except Exception as e:
@@ -1309,20 +1874,27 @@ class DynamicLoader:
             self._draw_image_error(screen, x, y, item.height - 10)
             return None
 
+    def _draw_image_placeholder(self, screen, x, y, width, height):
+        """绘制图片加载中的占位符"""
+        self._placeholder_drawn = True
+        placeholder_rect = pygame.Rect(x, y, width, height)
+        pygame.draw.rect(screen, self.placeholder_color, placeholder_rect)
+        pygame.draw.rect(screen, (150, 150, 150), placeholder_rect, 1)
+
     def _draw_image_error(self, screen, x, y, height):
         """绘制图片错误指示"""
         placeholder_rect = pygame.Rect(x, y, 270, height)
         pygame.draw.rect(screen, (100, 100, 150), placeholder_rect)
         pygame.draw.rect(screen, (150, 150, 150), placeholder_rect, 1)
 
-        error_text = self.font.render("?", True, (255, 200, 100))
+        error_text = self.render_text("?", (255, 200, 100))
         text_x = x + (270 - error_text.get_width()) // 2
         text_y = y + (height - error_text.get_height()) // 2
         screen.blit(error_text, (text_x, text_y))
 
     def _draw_scrollbar(self, screen: pygame.Surface):
         """绘制滚动条"""
-        total_height = sum(item.height for item in self.history)
+        total_height = self._heights.total
         visible_ratio = self.content_area_height / total_height
 
         # 滚动条轨道
@@ -1338,7 +1910,8 @@ class DynamicLoader:
         if visible_ratio < 1.0:
             scrollbar_height = max(
                 20, self.content_area_height * visible_ratio)
-            scrollbar_y = 10 + (self.scroll_offset / len(self.history)) * \
+            max_scroll = self.max_scroll_px
+            scrollbar_y = 10 + (self._view_top / max_scroll if max_scroll else 1) * \
                 (self.content_area_height - scrollbar_height)
 
             pygame.draw.rect(
@@ -1392,15 +1965,15 @@ class DynamicLoader:
         visible_items = len(self.current_display)
 
         # 计算是否在顶部
-        at_top = False
-        if total_items > 0:
-            total_height = sum(item.height for item in self.history)
-            at_top = total_height > self.content_area_height and self.scroll_offset >= total_items - visible_items
+        max_scroll = self.max_scroll_px
+        at_top = max_scroll > 0 and self.scroll_px >= max_scroll
 
         return {
             "total_items": total_items,
             "visible_items": visible_items,
             "scroll_offset": self.scroll_offset,
+            "scroll_px": self.scroll_px,
+            "max_scroll_px": max_scroll,
             "at_top": at_top,
-            "at_bottom": self.scroll_offset == 0
+            "at_bottom": self.scroll_px == 0
         }
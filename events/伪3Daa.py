@@ -179,7 +179,6 @@ def get_splash_vectors(radius):
 
 
 def event_water_demo(this):
-    import time
     import pygame
 
     W, H = 50, 25  # 画布稍微大一点
@@ -259,9 +258,9 @@ def event_water_demo(this):
         this.console.PRINT(frame_str)
 
         # [修改点 7] 增加帧延迟，让肉眼更能看清变化
-        time.sleep(0.08)
+        this.console.sleep(0.08)
 
-        for event in pygame.event.get():
+        for event in this.console.pump():
             if event.type == pygame.QUIT:
                 running = False
             if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
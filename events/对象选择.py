@@ -43,4 +43,7 @@ def event_对象选择(this):
             
             img_list.append(img_key)
 
+    # 立绘马上就要显示，先交给后台线程解码
+    this.console.loader.prefetch_images(img_list)
+
     return gradient_text, img_list, charalist
\ No newline at end of file
@@ -0,0 +1,63 @@
+# image_loader.py - 后台图片解码
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+
+class AsyncImageLoader:
+    """
+    后台线程池图片解码器
+
+    - request/prefetch 把图片文件交给线程池解码，不阻塞渲染
+    - 解码在工作线程完成；convert_alpha 需要显示模式，只能在主线程的 poll 里做，
+      从磁盘像素缓存映射出来的 Surface 已是显示格式，不再转换（避免复制整张图）
+    - 同一路径在解码完成前只会提交一次
+    """
+
+    def __init__(self, workers=2, decode=None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image-loader")
+        self._pending = {}  # 路径 -> Future
+        # 工作线程中调用的解码函数（只读文件并解码，不能 convert），
+        # 返回 (Surface, 是否为磁盘像素缓存映射出来的 Surface)
+        self._decode = decode or (lambda img_path: (pygame.image.load(img_path), False))
+
+    def request(self, img_path):
+        """提交一张图片的解码（已在排队时忽略）"""
+        if img_path and img_path not in self._pending:
+            self._pending[img_path] = self._executor.submit(self._decode, img_path)
+
+    def prefetch(self, img_paths):
+        """批量提交预取"""
+        for img_path in img_paths:
+            self.request(img_path)
+
+    def is_pending(self, img_path):
+        return img_path in self._pending
+
+    def has_pending(self):
+        """是否还有没收取的解码任务"""
+        return bool(self._pending)
+
+    def poll(self):
+        """
+        主线程调用：取出已完成的解码结果
+
+        Returns:
+            [(路径, Surface 或 None, 错误或 None), ...]
+        """
+        done = [path for path, future in self._pending.items() if future.done()]
+        results = []
+        for img_path in done:
+            future = self._pending.pop(img_path)
+            try:
+                image, mapped = future.result()
+                results.append((img_path, image if mapped else image.convert_alpha(), None))
+            except Exception as e:
+                results.append((img_path, None, e))
+        return results
+
+    def shutdown(self):
+        """退出时丢弃还没开始的任务"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
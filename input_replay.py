@@ -0,0 +1,107 @@
+# input_replay.py - INPUT 的脚本回放与录制
+import json
+import os
+import time
+from collections import deque
+
+SOURCE_KEY = "key"  # 键盘输入后回车确认
+SOURCE_CLICK = "click"  # 点击可点击文本得到的值
+
+
+def load_script(path):
+    """
+    读取输入脚本
+
+    - .jsonl：InputRecorder 录下的记录，每行 {"input": ..., "source": ...}
+    - 其他：纯文本，每行一条键盘输入（以 ; 开头的行为注释）
+
+    Returns:
+        [(输入, 来源), ...]
+    """
+    steps = []
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                steps.append((str(record.get('input', '')),
+                              record.get('source', SOURCE_KEY)))
+        else:
+            for line in f:
+                line = line.rstrip('\r\n')
+                if line.startswith(';'):
+                    continue
+                steps.append((line, SOURCE_KEY))
+    return steps
+
+
+class InputReplay:
+    """
+    INPUT 的脚本队列
+
+    队列不为空时 INPUT 直接取下一条，不进入事件循环；
+    既可以从文件加载，也可以在代码里 push（例如压力测试循环）。
+    """
+
+    def __init__(self, steps=()):
+        self._steps = deque()
+        self.consumed = 0
+        for step in steps:
+            self.push(step)
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_script(path))
+
+    def push(self, value, source=SOURCE_KEY):
+        """追加一条输入；value 也可以是 (输入, 来源) 元组"""
+        if isinstance(value, tuple):
+            value, source = value
+        self._steps.append((value, source))
+
+    def extend(self, values, source=SOURCE_KEY):
+        for value in values:
+            self.push(value, source)
+
+    def next(self):
+        """取出下一条 (输入, 来源)，脚本用完时返回 None"""
+        if not self._steps:
+            return None
+        self.consumed += 1
+        return self._steps.popleft()
+
+    def __len__(self):
+        return len(self._steps)
+
+
+class InputRecorder:
+    """把每次 INPUT 的结果（包括点击值）按 JSONL 写入文件，可直接作为回放脚本"""
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = 0
+        self._start = time.perf_counter()
+        record_dir = os.path.dirname(path)
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def record(self, value, source=SOURCE_KEY):
+        if self._file is None:
+            return
+        self.steps += 1
+        self._file.write(json.dumps({
+            'step': self.steps,
+            'time': round(time.perf_counter() - self._start, 3),
+            'input': value,
+            'source': source,
+        }, ensure_ascii=False) + "\n")
+        # 每条都写盘，程序崩溃时录制内容也不会丢
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -25,10 +25,11 @@ def cs(text="", color=None, click=None):
 class thethings:
     def __init__(self):
         self.console = SimpleERAConsole()
+        # 事件先不加载，交给 init_all 和 CSV、立绘清单一起在后台加载
+        self.event_manager = EventManager(self.console, load=False)
         # 在创建console后立即初始化所有组件
-        self.console.init_all()
+        self.console.init_all(self.event_manager)
         self.input = ""
-        self.event_manager = EventManager(self.console)
         self.charater_pwds = {}
         self.cs = ClickableString
         self.main()
@@ -0,0 +1,173 @@
+# pixel_cache.py - 解码后像素的磁盘缓存
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+import pygame
+
+# 文件格式：20 字节头（魔数、版本、像素格式、宽、高）+ 宽×高×4 字节像素
+_MAGIC = b'PXC1'
+_HEADER = struct.Struct('<4sI4sII')
+_VERSION = 1
+
+
+class PixelCache:
+    """
+    把解码（并裁剪）后的 RGBA 像素存到磁盘，下次启动直接内存映射
+
+    - 键为 源文件路径 + 修改时间 + 裁剪区域 的 sha1，源图片改动后自动失效
+    - 读取时 mmap 文件并交给 pygame.image.frombuffer，不复制像素，
+      代价只是缺页，而不是一次完整的 webp 解码
+    - 像素默认按 BGRA 存储，与常见显示模式下 convert_alpha 的格式一致，
+      映射出来的 Surface 可以直接快速 blit（RGBA 顺序的 Surface 每次 blit 都要转换）
+    - 磁盘占用超过上限时按最后使用时间淘汰最旧的文件
+    """
+
+    def __init__(self, cache_dir, max_bytes, pixel_format='BGRA'):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.pixel_format = pixel_format
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()  # 后台解码线程也会读写
+        self._total_bytes = None  # 首次写入时扫描目录得到
+
+    def _key_path(self, img_path, clip):
+        try:
+            mtime = os.stat(img_path).st_mtime_ns
+        except OSError:
+            return None
+        key = f"{os.path.abspath(img_path)}|{mtime}|{clip}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.rgba')
+
+    def load(self, img_path, clip=None):
+        """
+        读取缓存的像素
+
+        Args:
+            img_path: 源图片路径
+            clip: 裁剪区域，None 表示整张图
+
+        Returns:
+            pygame.Surface（与映射的文件共享内存）或 None
+        """
+        cache_path = self._key_path(img_path, clip)
+        try:
+            with open(cache_path, 'rb') as f:
+                # 写时复制映射：像素只读进来，修改 Surface 也不会改到文件
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (OSError, TypeError, ValueError):
+            self._count(hit=False)
+            return None
+
+        if len(mapped) < _HEADER.size:
+            self._count(hit=False)
+            return None
+        magic, version, pixel_format, width, height = _HEADER.unpack_from(mapped)
+        if (magic != _MAGIC or version != _VERSION
+                or len(mapped) != _HEADER.size + width * height * 4):
+            self._count(hit=False)
+            return None
+
+        # 更新修改时间作为最近使用时间，供淘汰参考
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+
+        self._count(hit=True)
+        return pygame.image.frombuffer(
+            memoryview(mapped)[_HEADER.size:], (width, height), pixel_format.decode('ascii'))
+
+    def _count(self, hit):
+        # 主线程和后台解码线程都会调用 load，计数放在锁里
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def contains(self, img_path, clip=None):
+        """缓存中是否已有这张图（不计入命中/未命中）"""
+        cache_path = self._key_path(img_path, clip)
+        return cache_path is not None and os.path.exists(cache_path)
+
+    def store(self, img_path, clip, surface):
+        """写入一张 Surface 的像素（先写临时文件再替换，避免读到半个文件）"""
+        cache_path = self._key_path(img_path, clip)
+        if cache_path is None:
+            return
+
+        width, height = surface.get_size()
+        data = pygame.image.tobytes(surface, self.pixel_format)
+        size = _HEADER.size + len(data)
+        if size > self.max_bytes:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temp_path = f"{cache_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, self.pixel_format.encode('ascii'),
+                                     width, height))
+                f.write(data)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"写入像素缓存失败: {cache_path} - {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(entry[1] for entry in self._entries())
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """[(路径, 字节数, 最后使用时间), ...]"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.rgba'):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """从最久未使用的文件开始删除，直到低于上限的 90%"""
+        entries = self._entries()
+        self._total_bytes = sum(entry[1] for entry in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if self._total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # 例如 Windows 上文件还被映射着
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            evictions, disk_bytes = self.evictions, self._total_bytes
+        total = hits + misses
+        return {
+            'name': 'pixel',
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+            'evictions': evictions,
+            'disk_bytes': disk_bytes,
+            'max_bytes': self.max_bytes,
+        }
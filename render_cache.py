@@ -0,0 +1,93 @@
+# render_cache.py - 渲染结果缓存
+from collections import OrderedDict
+
+
+def surface_bytes(surface):
+    """估算一个 Surface 占用的内存字节数"""
+    if surface is None:
+        return 0
+    width, height = surface.get_size()
+    return width * height * surface.get_bytesize()
+
+
+class SurfaceCache:
+    """
+    按字节预算淘汰的 Surface LRU 缓存
+
+    - get 命中时把条目移到末尾（最近使用）
+    - put 时如果超出字节预算，从头部（最久未用）开始淘汰
+    - 单个条目本身就超过预算时不缓存，直接返回给调用方使用
+    - 值不是单个 Surface（例如 (surface, 偏移) 元组）时，由调用方给出字节数
+    """
+
+    def __init__(self, max_bytes, name="cache"):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (surface, 字节数)
+        self.resident_bytes = 0
+        self.peak_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, surface, nbytes=None):
+        size = surface_bytes(surface) if nbytes is None else nbytes
+        if key in self._entries:
+            self.pop(key)
+        if size > self.max_bytes:
+            return surface
+
+        self._entries[key] = (surface, size)
+        self.resident_bytes += size
+        while self.resident_bytes > self.max_bytes and self._entries:
+            _, (_, old_size) = self._entries.popitem(last=False)
+            self.resident_bytes -= old_size
+            self.evictions += 1
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+        return surface
+
+    def pop(self, key):
+        """移除一个条目（例如所属内容被淘汰时）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.resident_bytes -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self.resident_bytes = 0
+
+    def items(self):
+        """按从旧到新的顺序返回 (key, surface)"""
+        return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """返回命中/淘汰统计，用于调试输出"""
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'resident_bytes': self.resident_bytes,
+            'peak_bytes': self.peak_bytes,
+            'max_bytes': self.max_bytes,
+        }
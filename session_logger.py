@@ -0,0 +1,134 @@
+# session_logger.py - 后台会话日志
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+_FLUSH = object()  # 队列中的“立即写盘”标记
+_CLOSE = object()  # 队列中的“关闭”标记
+
+
+class SessionLogger:
+    """
+    缓冲写入的会话日志
+
+    - write 只把一条记录放进队列，真正的文件写入在后台线程批量完成
+    - 按时间间隔或调用 flush（例如等待输入时）写盘，文件在整个会话中保持打开
+    - 文件超过大小上限时轮转：game_log.txt -> game_log.txt.1 -> game_log.txt.2 ...
+    - jsonl 模式下每行是一条带时间戳和类型的 JSON 记录
+    - close 写完队列中剩余的记录再关闭文件，程序退出时也会自动调用
+    """
+
+    def __init__(self, path, log_format="text", max_bytes=5 * 1024 * 1024,
+                 backups=3, flush_interval=1.0):
+        self.path = path
+        self.jsonl = log_format == "jsonl"
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._file = None
+        self._closed = False
+
+        try:
+            # 创建日志文件目录（如果不存在）
+            log_dir = os.path.dirname(path)
+            if log_dir and not os.path.exists(log_dir):
+                os.makedirs(log_dir)
+            self._file = open(path, 'w', encoding='utf-8')
+            self._write_header()
+            self._file.flush()
+        except Exception as e:
+            print(f"初始化日志文件失败: {e}")
+
+        self._thread = threading.Thread(
+            target=self._run, name="session-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text, kind="text"):
+        """记录一行日志（不阻塞）"""
+        if not self._closed:
+            self._queue.put((time.time(), kind, text))
+
+    def flush(self):
+        """请求后台线程尽快写盘（不等待完成）"""
+        if not self._closed:
+            self._queue.put(_FLUSH)
+
+    def close(self):
+        """写完剩余日志并关闭文件"""
+        if self._closed:
+            return
+        self._closed = True
+        # 已经关闭的日志不必留到退出时，也不让 atexit 一直引用它
+        atexit.unregister(self.close)
+        self._queue.put(_CLOSE)
+        self._thread.join(timeout=5)
+
+    def _write_header(self):
+        if self.jsonl:
+            self._file.write(self._format(time.time(), "session_start", ""))
+        else:
+            self._file.write(f"\n{'='*60}\n")
+            self._file.write(f"会话开始时间: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            self._file.write(f"{'='*60}\n\n")
+
+    def _format(self, timestamp, kind, text):
+        if self.jsonl:
+            return json.dumps({
+                'time': round(timestamp, 3),
+                'type': kind,
+                'text': text,
+            }, ensure_ascii=False) + "\n"
+        return time.strftime("[%H:%M:%S] ", time.localtime(timestamp)) + text + "\n"
+
+    def _run(self):
+        """后台线程：攒一批记录，到时间或收到 flush 时一次写出"""
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = _FLUSH
+
+            if record is _FLUSH or record is _CLOSE:
+                self._write_batch(pending)
+                pending = []
+                deadline = None
+                if record is _CLOSE:
+                    break
+                continue
+
+            pending.append(self._format(*record))
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, lines):
+        if not lines or self._file is None:
+            return
+        data = "".join(lines)
+        try:
+            if self.max_bytes and self._file.tell() + len(data.encode('utf-8')) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+        except Exception as e:
+            print(f"写入日志失败: {e}")
+
+    def _rotate(self):
+        """关闭当前文件，依次后移旧文件，重新打开一个空文件"""
+        self._file.close()
+        for i in range(self.backups, 0, -1):
+            source = self.path if i == 1 else f"{self.path}.{i - 1}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i}")
+        self._file = open(self.path, 'w', encoding='utf-8')
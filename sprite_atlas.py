@@ -0,0 +1,172 @@
+# sprite_atlas.py - 立绘图集（把一个立绘清单的所有差分打包成一张图）
+import json
+import os
+
+import pygame
+
+ATLAS_VERSION = 1
+ATLAS_PADDING = 1  # 子图之间留的空隙，避免缩放时采样到相邻差分
+MAX_ATLAS_WIDTH = 4096
+
+
+def read_manifest(csv_path):
+    """
+    读取立绘清单 <角色id>.csv
+
+    Returns:
+        [(差分名, 文件名, x, y, 宽, 高), ...]，格式不完整的行与控制台加载时一样按 (0, 0, 270, 270) 处理
+    """
+    rows = []
+    with open(csv_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(';'):
+                continue
+            parts = [p.strip() for p in line.split(',')]
+            if len(parts) < 2:
+                continue
+            rect = (0, 0, 270, 270)
+            if len(parts) >= 6:
+                try:
+                    rect = tuple(int(v) for v in parts[2:6])
+                except ValueError:
+                    pass
+            rows.append((parts[0], parts[1]) + rect)
+    return rows
+
+
+def atlas_paths(draw_dir, chara_id):
+    """图集图片和索引文件的路径：<绘目录>/<角色id>.atlas.png / .atlas.json"""
+    return (os.path.join(draw_dir, f"{chara_id}.atlas.png"),
+            os.path.join(draw_dir, f"{chara_id}.atlas.json"))
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def pack_shelves(sizes, max_width=MAX_ATLAS_WIDTH, padding=ATLAS_PADDING):
+    """
+    货架式装箱：按高度从高到低排序，一行放满换下一行
+
+    Args:
+        sizes: [(宽, 高), ...]
+
+    Returns:
+        (每个矩形的左上角坐标列表（与 sizes 顺序一致）, 图集宽, 图集高)
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    positions = [None] * len(sizes)
+    shelf_x = shelf_y = shelf_height = 0
+    atlas_width = 0
+
+    for i in order:
+        width, height = sizes[i]
+        if shelf_x and shelf_x + width > max_width:
+            shelf_y += shelf_height + padding
+            shelf_x = shelf_height = 0
+        positions[i] = (shelf_x, shelf_y)
+        shelf_x += width + padding
+        shelf_height = max(shelf_height, height)
+        atlas_width = max(atlas_width, shelf_x - padding)
+
+    return positions, atlas_width, shelf_y + shelf_height
+
+
+def build_atlas(draw_dir, chara_id):
+    """
+    为一个立绘目录生成图集
+
+    清单中矩形超出原图范围的差分不打包，运行时继续使用原图。
+
+    Returns:
+        统计信息字典；清单不存在时返回 None
+    """
+    csv_path = os.path.join(draw_dir, f"{chara_id}.csv")
+    if not os.path.exists(csv_path):
+        return None
+
+    rows = read_manifest(csv_path)
+    sources = {}  # 文件名 -> Surface（每个源文件只解码一次）
+    rects = {}  # 去重后的 (文件名, x, y, 宽, 高) -> 下标
+    entries = {}  # 差分名 -> rects 下标
+
+    for name, filename, x, y, width, height in rows:
+        if filename not in sources:
+            path = os.path.join(draw_dir, filename)
+            try:
+                sources[filename] = pygame.image.load(path)
+            except (pygame.error, FileNotFoundError) as e:
+                print(f"跳过无法读取的图片: {path} - {e}")
+                sources[filename] = None
+        image = sources[filename]
+        if image is None or width <= 0 or height <= 0:
+            continue
+        if not image.get_rect().contains(pygame.Rect(x, y, width, height)):
+            continue
+
+        entries[name] = rects.setdefault((filename, x, y, width, height), len(rects))
+
+    if not rects:
+        return {'entries': 0, 'sources': 0, 'size': (0, 0)}
+
+    rects = list(rects)
+    positions, atlas_width, atlas_height = pack_shelves(
+        [(rect[3], rect[4]) for rect in rects])
+    atlas = pygame.Surface((atlas_width, atlas_height), pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    for (filename, x, y, width, height), position in zip(rects, positions):
+        # 对全透明底图取 MAX 等于原样拷贝像素（普通 blit 会按 alpha 混合，半透明边缘会变暗）
+        atlas.blit(sources[filename], position, pygame.Rect(x, y, width, height),
+                   special_flags=pygame.BLEND_RGBA_MAX)
+
+    image_path, index_path = atlas_paths(draw_dir, chara_id)
+    pygame.image.save(atlas, image_path)
+
+    used = sorted({rect[0] for rect in rects})
+    index = {
+        'version': ATLAS_VERSION,
+        'image': os.path.basename(image_path),
+        'size': [atlas_width, atlas_height],
+        'csv_mtime': _mtime(csv_path),
+        'sources': {filename: _mtime(os.path.join(draw_dir, filename)) for filename in used},
+        'entries': {name: [*positions[i], rects[i][3], rects[i][4]]
+                    for name, i in entries.items()},
+    }
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+    return {'entries': len(entries), 'sources': len(used), 'size': (atlas_width, atlas_height)}
+
+
+def load_atlas(draw_dir, chara_id):
+    """
+    读取图集索引
+
+    图集比清单或任一源图片旧时视为过期，返回 None（运行时退回逐个文件加载）。
+
+    Returns:
+        {'image': 图集文件名, 'entries': {差分名: [x, y, 宽, 高]}} 或 None
+    """
+    image_path, index_path = atlas_paths(draw_dir, chara_id)
+    if not os.path.exists(index_path) or not os.path.exists(image_path):
+        return None
+
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if index.get('version') != ATLAS_VERSION:
+        return None
+    if index.get('csv_mtime') != _mtime(os.path.join(draw_dir, f"{chara_id}.csv")):
+        return None
+    for filename, mtime in index.get('sources', {}).items():
+        if mtime != _mtime(os.path.join(draw_dir, filename)):
+            return None
+
+    return index
@@ -0,0 +1,123 @@
+# startup.py - 分阶段启动：数据在后台线程加载，主线程只负责显示进度
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+WAITING = "waiting"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class StartupStage:
+    """启动流程中的一个阶段"""
+
+    __slots__ = ('name', 'label', 'func', 'deps', 'state', 'result', 'error',
+                 'started', 'elapsed', 'future')
+
+    def __init__(self, name, label, func, deps=()):
+        self.name = name
+        self.label = label  # 进度界面上显示的名字
+        self.func = func  # 参数依次为各依赖阶段的结果
+        self.deps = tuple(deps)
+        self.state = WAITING
+        self.result = None
+        self.error = None
+        self.started = None
+        self.elapsed = None  # 秒
+        self.future = None
+
+
+class StartupPipeline:
+    """
+    按依赖关系在线程池里运行启动阶段
+
+    - 依赖都完成的阶段立刻提交，互不依赖的阶段并行执行
+    - 阶段函数只能做文件读取和纯数据处理，不能调用 PRINT 或任何 pygame 显示接口；
+      需要输出的内容作为结果返回，由主线程在 finish 之后处理
+    - 主线程循环调用 wait(timeout) 等待，期间照常处理窗口事件、重绘进度
+    """
+
+    def __init__(self, workers=3):
+        self.stages = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="startup")
+        self._start = None
+        self.elapsed = None  # 从 start 到全部完成的秒数
+
+    def add(self, name, label, func, deps=()):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"启动阶段 {name} 依赖的 {dep} 尚未添加")
+        self.stages[name] = StartupStage(name, label, func, deps)
+        return self.stages[name]
+
+    def start(self):
+        self._start = time.perf_counter()
+        self._submit_ready()
+
+    def _submit_ready(self):
+        for stage in self.stages.values():
+            if stage.state != WAITING:
+                continue
+            deps = [self.stages[dep] for dep in stage.deps]
+            if any(dep.state == FAILED for dep in deps):
+                stage.state = FAILED
+                stage.error = RuntimeError(f"依赖的阶段未完成: {', '.join(stage.deps)}")
+                continue
+            if all(dep.state == DONE for dep in deps):
+                stage.state = RUNNING
+                stage.future = self._executor.submit(
+                    self._run_stage, stage, [dep.result for dep in deps])
+
+    @staticmethod
+    def _run_stage(stage, args):
+        stage.started = time.perf_counter()
+        try:
+            return stage.func(*args)
+        finally:
+            stage.elapsed = time.perf_counter() - stage.started
+
+    def _collect(self):
+        changed = False
+        for stage in self.stages.values():
+            if stage.state == RUNNING and stage.future.done():
+                try:
+                    stage.result = stage.future.result()
+                    stage.state = DONE
+                except Exception as e:
+                    stage.error = e
+                    stage.state = FAILED
+                changed = True
+        if changed:
+            self._submit_ready()
+
+    def wait(self, timeout=None):
+        """
+        等待任一阶段结束或超时
+
+        Returns:
+            是否所有阶段都已结束（成功或失败）
+        """
+        running = [stage.future for stage in self.stages.values() if stage.state == RUNNING]
+        if running:
+            wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        self._collect()
+        finished = all(stage.state in (DONE, FAILED) for stage in self.stages.values())
+        if finished and self.elapsed is None:
+            self.elapsed = time.perf_counter() - self._start
+        return finished
+
+    def result(self, name):
+        """取阶段结果；阶段失败时重新抛出它的异常"""
+        stage = self.stages[name]
+        if stage.state == FAILED:
+            raise stage.error
+        return stage.result
+
+    def timings(self):
+        """{阶段名: 耗时（毫秒）}，未运行的阶段为 None"""
+        return {name: None if stage.elapsed is None else stage.elapsed * 1000
+                for name, stage in self.stages.items()}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
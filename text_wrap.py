@@ -0,0 +1,78 @@
+# text_wrap.py - 自动换行引擎
+import weakref
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class GlyphAdvanceCache:
+    """
+    字形步进宽度表
+
+    每种字体一张 字符 -> 宽度 的字典，每个字符只测量一次。
+    口上和 ASCII 画里反复出现的是同一批汉字，测量结果可以一直复用。
+    表按字体弱引用保存，换掉的字体被回收后它的表也随之释放。
+    """
+
+    def __init__(self):
+        self._tables = weakref.WeakKeyDictionary()  # 字体 -> {字符: 宽度}
+
+    def widths(self, font, text):
+        """返回 text 中每个字符的宽度列表"""
+        table = self._tables.get(font)
+        if table is None:
+            table = self._tables[font] = {}
+        for char in set(text).difference(table):
+            table[char] = font.size(char)[0]
+        return [table[char] for char in text]
+
+    def forget(self, font):
+        """丢弃某个字体的宽度表（换字体时调用）"""
+        self._tables.pop(font, None)
+
+    def clear(self):
+        self._tables.clear()
+
+
+class TextWrapper:
+    """
+    基于累计宽度和二分查找的换行器
+
+    一段文本先算出累计宽度数组，之后每一行的断点都是一次二分查找，
+    整段文本的换行是线性时间。
+    """
+
+    def __init__(self):
+        self.advances = GlyphAdvanceCache()
+
+    def prefix_widths(self, font, text):
+        """累计宽度数组：cum[i] 为前 i 个字符的总宽度"""
+        return list(accumulate(self.advances.widths(font, text), initial=0))
+
+    @staticmethod
+    def fit(cum, start, space):
+        """
+        从 start 开始，在 space 宽度内最多能放到第几个字符
+
+        Returns:
+            end 下标（不含），放不下任何字符时返回 start
+        """
+        return max(start, bisect_right(cum, cum[start] + space, start) - 1)
+
+    def wrap(self, font, text, max_width):
+        """
+        把一行文本按最大宽度切成多行（贪心）
+
+        单个字符就超宽时独占一行，避免死循环。
+        """
+        if not text:
+            return []
+        cum = self.prefix_widths(font, text)
+        lines = []
+        start = 0
+        while start < len(text):
+            end = self.fit(cum, start, max_width)
+            if end == start:
+                end = start + 1
+            lines.append(text[start:end])
+            start = end
+        return lines
@@ -0,0 +1,426 @@
+# tools/benchmark.py - 性能基准测试
+#
+# 用法（在游戏根目录运行）：
+#   python tools/benchmark.py                          # 跑全部基准
+#   python tools/benchmark.py wrap_cjk draw_mixed --scale 4 --repeat 10
+#   python tools/benchmark.py --baseline bench_baseline.json   # 与基线比较
+#   python tools/benchmark.py --list
+#
+# 以无界面模式运行（SDL dummy 驱动），不需要显示器。结果写成 JSON（默认
+# ./cache/benchmark.json），可以直接拿来当下次的 --baseline；有基准比基线慢
+# 超过 --threshold 时退出码为 1，方便在脚本里检查性能回退。
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame  # noqa: E402
+
+from dynamic_loader import DynamicLoader, InlineFragment  # noqa: E402
+
+# 常用汉字/假名，用来拼出长度和内容都不重复的测试文本（避免全部命中换行缓存）
+CJK_CHARS = ("的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动"
+             "同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自"
+             "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろ"
+             "，。！？、")
+
+BENCHMARKS = {}  # 名称 -> (函数, 说明)
+
+
+def benchmark(name, description):
+    """注册一个基准：函数接收 BenchContext，返回 (计时秒数, 操作次数)"""
+    def register(func):
+        BENCHMARKS[name] = (func, description)
+        return func
+    return register
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的 print 输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+class BenchContext:
+    """基准之间共享的数据集，按需创建"""
+
+    def __init__(self, scale, seed=0):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        # 日志、存档和清单缓存都写在这里，close 时整个删除
+        self._temp = tempfile.TemporaryDirectory(
+            prefix="pera-bench-", ignore_cleanup_errors=True)
+        self.temp_dir = self._temp.name
+        self._loaders = []
+        self._console = None
+        self._init = None
+        self._event_manager = None
+
+    def cjk_text(self, length):
+        return "".join(self.rng.choice(CJK_CHARS) for _ in range(length))
+
+    def new_loader(self):
+        """不带后台解码和磁盘缓存的加载器，结果只取决于被测代码本身"""
+        console = self.console
+        loader = DynamicLoader(
+            console.screen_width, console.screen_height, console.font,
+            console.input_area_height, os.path.join(self.temp_dir, "loader_log.txt"))
+        self._loaders.append(loader)
+        return loader
+
+    @property
+    def console(self):
+        if self._console is None:
+            from ERAconsole import SimpleERAConsole
+
+            temp_dir = self.temp_dir
+
+            class BenchConsole(SimpleERAConsole):
+                # 不读 config.json：用默认配置，日志和立绘清单缓存写到临时目录，关闭后台解码和像素缓存
+                def _load_config(self):
+                    config = self.default_config.copy()
+                    config.update({
+                        "headless": True,
+                        "log_file": os.path.join(temp_dir, "game_log.txt"),
+                        "async_image_workers": 0,
+                        "pixel_cache_mb": 0,
+                        "manifest_cache": os.path.join(temp_dir, "chara_manifests.json"),
+                    })
+                    return config
+
+            with quiet():
+                self._console = BenchConsole()
+        return self._console
+
+    @property
+    def init(self):
+        if self._init is None:
+            from init import initall
+            with quiet():
+                self._init = initall("./csv/")
+        return self._init
+
+    @property
+    def this(self):
+        """事件函数需要的 this（与 main.thethings 相同的属性）"""
+        console = self.console
+        console.init = self.init
+        if self._event_manager is None:
+            from Eventmanger import EventManager
+            with quiet():
+                self._event_manager = EventManager(console)
+        return SimpleNamespace(console=console, event_manager=self._event_manager)
+
+    def sample_image(self):
+        """./img 下找一张立绘用于叠加绘制，没有时返回 None"""
+        for root, _, files in os.walk("./img"):
+            for name in sorted(files):
+                if name.endswith(('.webp', '.png')) and '.atlas.' not in name:
+                    return os.path.join(root, name)
+        return None
+
+    def close(self):
+        """关闭所有加载器的日志文件并删除临时目录"""
+        for loader in self._loaders:
+            loader.close()
+        self._loaders = []
+        if self._console is not None:
+            self._console.loader.close()
+        self._temp.cleanup()
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+# ==========================
+# 基准
+# ==========================
+
+@benchmark("wrap_cjk", "add_text：长中日文本的换行排版")
+def bench_wrap_cjk(ctx):
+    lines = [ctx.cjk_text(300) for _ in range(200 * ctx.scale)]
+    loader = ctx.new_loader()
+
+    def run():
+        for line in lines:
+            loader.add_text(line)
+    return timed(run), len(lines)
+
+
+@benchmark("inline_fragments", "add_inline_fragments：混合可点击片段的换行排版")
+def bench_inline_fragments(ctx):
+    rows = []
+    for i in range(200 * ctx.scale):
+        rows.append([InlineFragment(ctx.cjk_text(40), (255, 255, 255),
+                                    click_value=str(j) if j % 2 else None)
+                     for j in range(8)])
+    loader = ctx.new_loader()
+
+    def run():
+        for fragments in rows:
+            loader.add_inline_fragments(fragments)
+    return timed(run), len(rows)
+
+
+@benchmark("draw_mixed", "draw()：文本与图片叠加混排时滚动绘制")
+def bench_draw_mixed(ctx):
+    console = ctx.console
+    loader = ctx.new_loader()
+    image = ctx.sample_image()
+    if image:
+        loader.register_image_info("bench", {
+            'path': image, 'original_width': 270, 'original_height': 270,
+            'clip_x': 0, 'clip_y': 0})
+
+    for i in range(500 * ctx.scale):
+        loader.add_text(ctx.cjk_text(120))
+        if image and i % 20 == 0:
+            loader.add_image_mark(
+                "[IMG_STACK:bench{size:(180,180)}|bench{offset:(90,0);size:(180,180)}]",
+                f"stack{i}", 400, 180)
+    loader.scroll_to_bottom()
+
+    frames = 120
+
+    def run():
+        for frame in range(frames):
+            # 先向上滚一段，再滚回来，覆盖首次绘制和重复绘制
+            loader.scroll_by_pixels(37 if frame < frames // 2 else -37)
+            console.screen.fill((0, 0, 0))
+            loader.draw(console.screen)
+    return timed(run), frames
+
+
+@benchmark("parse_stack_mark", "parse_image_stack_mark：解析图片叠加标记")
+def bench_parse_stack_mark(ctx):
+    loader = ctx.new_loader()
+    names = [f"bench_{i}" for i in range(50)]
+    for name in names:
+        loader.register_image_info(name, {
+            'path': f"./img/{name}.webp", 'original_width': 270, 'original_height': 270,
+            'clip_x': 0, 'clip_y': 0})
+    marks = []
+    for i in range(2000 * ctx.scale):
+        layers = ctx.rng.sample(names, 3)
+        marks.append("[IMG_STACK:" + "|".join(
+            f"{name}{{offset:({j * 10},{j * 5});size:(180,180)}}"
+            for j, name in enumerate(layers)) + "]")
+
+    def run():
+        for mark in marks:
+            loader.parse_image_stack_mark(mark)
+    return timed(run), len(marks)
+
+
+@benchmark("initall", "initall：读取全部 CSV")
+def bench_initall(ctx):
+    from init import initall
+
+    def run():
+        with quiet():
+            initall("./csv/")
+    return timed(run), 1
+
+
+@benchmark("load_chara_images", "_load_all_chara_images：读取立绘清单并注册图片")
+def bench_load_chara_images(ctx):
+    console = ctx.console
+    console.init = ctx.init
+    console.image_data, console.chara_images = {}, {}
+
+    def run():
+        with quiet():
+            console._load_all_chara_images()
+    return timed(run), len(ctx.init.chara_ids)
+
+
+@benchmark("startup", "init_all：分阶段启动（CSV、立绘清单、事件在后台并行加载）")
+def bench_startup(ctx):
+    from Eventmanger import EventManager
+
+    console = ctx.console
+
+    def run():
+        with quiet():
+            console.image_data, console.chara_images = {}, {}
+            console.init_all(EventManager(console, load=False))
+    return timed(run), 1
+
+
+@benchmark("build_allstate", "event_build_allstate：构建全部角色状态")
+def bench_build_allstate(ctx):
+    module = importlib.import_module("events.初始化事件.state_builder")
+    this = ctx.this
+
+    def run():
+        with quiet():
+            module.event_build_allstate(this)
+    return timed(run), len(ctx.init.chara_ids)
+
+
+@benchmark("save_load", "SaveSystem.save_game / load_game：存档与读档")
+def bench_save_load(ctx):
+    from utils.save import SaveSystem
+
+    module = importlib.import_module("events.初始化事件.state_builder")
+    this = ctx.this
+    with quiet():
+        module.event_build_allstate(this)
+        state = module.event_get_context_state(this)
+    # 按规模复制角色，模拟更大的存档
+    world = state['world_state']
+    state['world_state'] = {f"{chara_id}_{copy}": chara
+                            for copy in range(ctx.scale)
+                            for chara_id, chara in world.items()}
+    saver = SaveSystem(os.path.join(ctx.temp_dir, "save"))
+
+    def run():
+        with quiet():
+            saver.save_game(state, "bench")
+            saver.load_game("bench")
+    return timed(run), 1
+
+
+@benchmark("load_events", "EventManager.load_events：扫描并重新导入事件模块")
+def bench_load_events(ctx):
+    manager = ctx.this.event_manager
+
+    def run():
+        with quiet():
+            manager.load_events(is_reload=True)
+    return timed(run), len(manager.events)
+
+
+# ==========================
+# 运行与比较
+# ==========================
+
+def run_benchmarks(names, scale, repeat, warmup):
+    ctx = BenchContext(scale)
+    results = {}
+    try:
+        for name in names:
+            func, description = BENCHMARKS[name]
+            runs = []
+            ops = 0
+            for i in range(warmup + repeat):
+                elapsed, ops = func(ctx)
+                if i >= warmup:
+                    runs.append(elapsed)
+            median = statistics.median(runs)
+            results[name] = {
+                'description': description,
+                'ops': ops,
+                'runs': [round(t, 6) for t in runs],
+                'min': round(min(runs), 6),
+                'median': round(median, 6),
+                'mean': round(statistics.fmean(runs), 6),
+                'per_op_us': round(median / ops * 1e6, 3) if ops else None,
+            }
+            print(f"{name:<20} 中位数 {median * 1000:10.2f} ms  "
+                  f"最快 {min(runs) * 1000:10.2f} ms  ({ops} 次操作)")
+    finally:
+        ctx.close()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较中位数
+
+    Returns:
+        变慢超过阈值的基准名列表
+    """
+    regressions = []
+    print(f"\n{'基准':<20} {'基线(ms)':>12} {'当前(ms)':>12} {'变化':>8}")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = result['median'] / base['median'] if base['median'] else float('inf')
+        mark = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = "  <- 变慢"
+        print(f"{name:<20} {base['median'] * 1000:12.2f} {result['median'] * 1000:12.2f} "
+              f"{(ratio - 1) * 100:+7.1f}%{mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="加载器、初始化、事件和存档的性能基准")
+    parser.add_argument('names', nargs='*', help="只运行这些基准（默认全部）")
+    parser.add_argument('--list', action='store_true', help="列出所有基准")
+    parser.add_argument('--scale', type=int, default=1, help="数据规模倍数（文本行数、标记数、存档角色数）")
+    parser.add_argument('--repeat', type=int, default=5, help="每个基准计时的次数")
+    parser.add_argument('--warmup', type=int, default=1, help="计时前预热的次数")
+    parser.add_argument('--output', default='./cache/benchmark.json', help="结果文件")
+    parser.add_argument('--baseline', help="用来比较的基线结果文件")
+    parser.add_argument('--threshold', type=float, default=0.10, help="中位数变慢超过该比例视为回退")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (_, description) in BENCHMARKS.items():
+            print(f"{name:<20} {description}")
+        return 0
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}（--list 查看全部）")
+    if args.scale < 1 or args.repeat < 1 or args.warmup < 0:
+        parser.error("--scale 和 --repeat 至少为 1，--warmup 不能为负数")
+
+    # 被测代码按游戏根目录的相对路径读写文件
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.chdir(ROOT_DIR)
+    results = run_benchmarks(args.names or list(BENCHMARKS), args.scale,
+                             args.repeat, args.warmup)
+
+    report = {
+        'version': 1,
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != args.scale:
+            print(f"警告: 基线的规模为 {baseline.get('scale')}，当前为 {args.scale}，结果不可直接比较")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} 个基准变慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
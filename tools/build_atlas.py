@@ -0,0 +1,64 @@
+# tools/build_atlas.py - 离线生成立绘图集
+#
+# 用法（在游戏根目录运行）：
+#   python tools/build_atlas.py            # 为 ./img 下所有角色生成图集
+#   python tools/build_atlas.py 0 1 --force
+#
+# 每个 ./img/<角色id>/<xx绘>/ 目录生成 <角色id>.atlas.png 和 <角色id>.atlas.json，
+# 游戏启动时如果图集比清单和源图片都新，就改为从图集读取差分。
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame  # noqa: E402
+
+import sprite_atlas  # noqa: E402
+
+
+def iter_draw_dirs(img_dir, chara_ids=None):
+    """遍历 (角色id, 绘目录)"""
+    for chara_id in sorted(os.listdir(img_dir)):
+        if chara_ids and chara_id not in chara_ids:
+            continue
+        chara_dir = os.path.join(img_dir, chara_id)
+        if not os.path.isdir(chara_dir):
+            continue
+        for item in sorted(os.listdir(chara_dir)):
+            draw_dir = os.path.join(chara_dir, item)
+            if os.path.isdir(draw_dir) and item.endswith('绘'):
+                yield chara_id, draw_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="把每个立绘清单打包成一张图集")
+    parser.add_argument('chara_ids', nargs='*', help="只处理这些角色（默认全部）")
+    parser.add_argument('--img-dir', default='./img', help="图片根目录")
+    parser.add_argument('--force', action='store_true', help="图集未过期也重新生成")
+    args = parser.parse_args(argv)
+
+    pygame.init()
+    start = time.perf_counter()
+    built = skipped = 0
+
+    for chara_id, draw_dir in iter_draw_dirs(args.img_dir, set(args.chara_ids)):
+        if not args.force and sprite_atlas.load_atlas(draw_dir, chara_id):
+            skipped += 1
+            continue
+        result = sprite_atlas.build_atlas(draw_dir, chara_id)
+        if result is None:
+            print(f"{draw_dir}: 没有清单 {chara_id}.csv，跳过")
+            continue
+        width, height = result['size']
+        print(f"{draw_dir}: {result['sources']}个源文件 -> "
+              f"{result['entries']}个差分，图集 {width}x{height}")
+        built += 1
+
+    print(f"完成：生成 {built} 个图集，{skipped} 个已是最新，"
+          f"用时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
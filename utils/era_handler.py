@@ -36,6 +36,15 @@ class EraDataProxy:
 
 
 class EraKojoHandler:
+    # Rand 使用的随机数生成器，默认与全局 random 共用状态；
+    # 回放/测试时可换成带种子的 random.Random 以得到可复现的结果（见 seed_rng）
+    rng = random
+
+    @classmethod
+    def seed_rng(cls, seed):
+        """用固定种子替换 Rand 的随机数生成器"""
+        cls.rng = random.Random(seed)
+
     def __init__(self, console, event_context=None):
         """
         :param console: Pera 的 console 对象 (包含 init 数据)
@@ -253,9 +262,9 @@ class EraKojoHandler:
         Rand([1, 2, 3]) -> 随机选一个
         """
         if isinstance(val, int):
-            return random.randint(0, val - 1)
+            return self.rng.randint(0, val - 1)
         elif isinstance(val, list) or isinstance(val, tuple):
-            return random.choice(val)
+            return self.rng.choice(val)
         return 0
 
     def print_kojo(self, text):